@@ -0,0 +1,63 @@
+import streamlit as st
+import pandas as pd
+from metrics_panel import render_metrics_sidebar
+from price_analysis import BASE_CURRENCY, add_numeric_prices
+from product_lookup import (
+    LOOKUP_COLUMNS,
+    LOOKUP_DEADLINE,
+    MAPPING_SOURCES,
+    build_tasks,
+    iter_lookup,
+    load_catalog_index,
+    match_products,
+)
+from search_panel import render_product_search
+
+# 页面设置
+st.set_page_config(page_title="Cross-Retailer Price Lookup", layout="wide")
+
+st.title("🔎 Cross-Retailer Price Lookup")
+st.write("Enter a model name to look it up at Elkjop, Komplett and Kjell in all countries at once.")
+
+# 各零售商对照表（product_mapping.csv、KPL.csv、Kjell 的 Google Sheet）的搜索索引
+catalog_index = load_catalog_index()
+
+model_input = st.text_input("Enter a model name or product ID (e.g., Archer AX23)", "")
+model_choice = render_product_search(catalog_index, label="Or search for a model:")
+
+# 总时限：到时间还没有返回的站点显示为 timed out，不再等待
+deadline = st.slider("Deadline (seconds)", min_value=2, max_value=60, value=LOOKUP_DEADLINE)
+
+# 跳过本地缓存，强制重新抓取
+bypass_cache = st.checkbox("Bypass cache", value=False)
+
+if st.button("Get Prices Everywhere"):
+    query = model_input.strip() or (model_choice[1] if model_choice else "")
+    matches = match_products(query, catalog_index) if query else {}
+    if not query:
+        st.error("Please enter a model name or select one from the list.")
+    elif not matches:
+        st.error(f"'{query}' was not found in any retailer's product list.")
+    else:
+        for retailer, products in matches.items():
+            st.caption(f"**{retailer}**: " + ", ".join(f"{name} ({product_id})" for product_id, name in products))
+        missing = [retailer for retailer in MAPPING_SOURCES if retailer not in matches]
+        if missing:
+            st.caption("Not listed at: " + ", ".join(missing))
+
+        # 每返回一个结果刷新一次表格，慢的站点显示为 pending
+        table = st.empty()
+        for rows in iter_lookup(build_tasks(matches), deadline, use_cache=not bypass_cache):
+            table.dataframe(pd.DataFrame(rows, columns=LOOKUP_COLUMNS), use_container_width=True)
+
+        # 最终结果：换算为同一币种后的实际售价，便于跨零售商比较
+        result_df = add_numeric_prices(pd.DataFrame(rows, columns=LOOKUP_COLUMNS))
+        result_df = result_df[LOOKUP_COLUMNS + [f"Price ({BASE_CURRENCY})"]]
+        table.dataframe(result_df, use_container_width=True)
+        timed_out = (result_df["Status"] == "timed out").sum()
+        if timed_out:
+            st.warning(f"{timed_out} lookups did not finish within {deadline} seconds.")
+        st.download_button("Download Results", result_df.to_csv(index=False), file_name="cross_retailer_prices.csv")
+
+# 侧边栏：共享请求缓存命中统计和请求耗时
+render_metrics_sidebar()
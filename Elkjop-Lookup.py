@@ -1,74 +1,34 @@
-import requests
-import re
 import csv
-from bs4 import BeautifulSoup
+import requests
 import streamlit as st
-import pandas as pd
 import io
+import pandas as pd
+from canonical_urls import canonical_url
+from catalog_runs import PRICE_COLUMNS, iter_template_catalog
+from price_analysis import BASE_CURRENCY, cross_country_spreads
+from mapping_loader import load_mapping_csv, resolve_products, split_entries
+from metrics_panel import render_metrics_sidebar
+from search_panel import load_mapping_index, render_product_search
+from retailers import ELKJOP_URL_TEMPLATES, extract_elkjop_prices as extract_prices
 
 # GitHub 上存储产品编号和名称对照表的原始 URL
 GITHUB_CSV_URL = "https://raw.githubusercontent.com/DaryWang/product-lookup-app/refs/heads/main/product_mapping.csv"
 
-# 国家网站模板，按要求顺序排列
-URL_TEMPLATES = {
-    "Sweden": "https://www.elgiganten.se/product/{}",
-    "Norway": "https://www.elkjop.no/product/{}",
-    "Finland": "https://www.gigantti.fi/product/{}",
-    "Denmark": "https://www.elgiganten.dk/product/{}",
-}
-
-# 正则表达式：只提取数字和符号（例如，`,`和`.-`）
-def clean_price(price_text):
-    cleaned_price = re.sub(r'[^\d,.-]', '', price_text).strip()
-    return cleaned_price
-
-# 提取价格的函数（处理重定向）
-def extract_prices(url):
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers, allow_redirects=True)
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    # 提取常规价格
-    price_element = soup.find('div', {'class': 'grid grid-cols-subgrid grid-rows-subgrid row-span-2 gap-1 items-end'})
-    if price_element:
-        inc_vat_price = price_element.find('span', {'class': 'inc-vat'})
-        regular_price = inc_vat_price.get_text(strip=True) if inc_vat_price else 'N/A'
-    else:
-        regular_price = 'N/A'
-    regular_price = clean_price(regular_price)
-
-    # 提取促销价格
-    promo_price_element = soup.find('span', {'class': 'font-regular flex flex-shrink px-1 items-center text-base'})
-    if promo_price_element:
-        promo_price = promo_price_element.find('span', {'class': 'inc-vat'})
-        if promo_price:
-            promo_price_text = promo_price.get_text(strip=True)
-            promo_price_value = promo_price_text.replace('Førpris: ', '').replace('Tidigare pris', '').strip()
-            promo_price = clean_price(promo_price_value)
-        else:
-            promo_price = 'N/A'
-    else:
-        promo_price = 'N/A'
-
-    if promo_price != 'N/A':
-        regular_price, promo_price = promo_price, regular_price
-
-    return regular_price, promo_price
+# 国家网站模板及价格提取逻辑统一放在 retailers.py 中
+URL_TEMPLATES = ELKJOP_URL_TEMPLATES
 
 # 从 GitHub 读取产品编号和名称对照表
 def load_product_mapping_from_github():
-    response = requests.get(GITHUB_CSV_URL)
-    if response.status_code == 200:
-        # 使用 pandas 读取 CSV 内容
-        df = pd.read_csv(io.StringIO(response.text))
-        if 'Product ID' in df.columns and 'Product Name' in df.columns:
-            return df
-        else:
-            st.error("GitHub CSV file must contain 'Product ID' and 'Product Name' columns.")
-            return None
-    else:
+    # 进程内缓存 + 条件请求重新验证，离线时使用仓库自带的 CSV
+    df = load_mapping_csv(GITHUB_CSV_URL)
+    if df is None:
         st.error("Failed to load the CSV file from GitHub.")
         return None
+    if 'Product ID' in df.columns and 'Product Name' in df.columns:
+        return df
+    else:
+        st.error("GitHub CSV file must contain 'Product ID' and 'Product Name' columns.")
+        return None
 
 # 将查询结果保存为 TXT 文件（CSV 格式）
 def save_results_to_txt(product_id, results):
@@ -88,32 +48,29 @@ st.write("You can either input any Product ID or choose a tp-link model from the
 # 从 GitHub 加载对照表
 product_mapping_df = load_product_mapping_from_github()
 
+# 对照表的搜索索引（产品搜索框和批量查询的名称匹配共用）
+mapping_index = load_mapping_index([GITHUB_CSV_URL])
+
 # 用户输入产品编号
 product_id_input = st.text_input("Enter the product ID (e.g., 897511)", "")
 
-# 用户选择产品名称（如果对照表已加载）
-product_name_input = None
+# 用户搜索产品名称（模糊匹配，如果对照表已加载）
+product_choice = None
 if product_mapping_df is not None:
-    product_names = [""] + list(product_mapping_df['Product Name'].dropna().unique())
-product_name_input = st.selectbox(
-    "Or select a product name from the list:",
-    product_names,
-    index=0  # 默认选中空白项
-)
+    product_choice = render_product_search(mapping_index)
 
 
 # 根据选择的产品名称或产品编号查询价格
+# 跳过本地缓存，强制重新抓取
+bypass_cache = st.checkbox("Bypass cache", value=False)
+
 if st.button("Get Prices"):
     selected_product_id = None
 
     if product_id_input.strip():
         selected_product_id = product_id_input.strip()
-        product_name_input = ""  # 清空产品名（符合你要求）
-    elif product_name_input and product_name_input != "":
-        selected_product_id = product_mapping_df.loc[
-            product_mapping_df['Product Name'] == product_name_input, 'Product ID'
-        ].values
-        selected_product_id = selected_product_id[0] if len(selected_product_id) > 0 else None
+    elif product_choice:
+        selected_product_id = product_choice[0]
     else:
         st.error("Please enter a product ID or select a product name.")
 
@@ -121,8 +78,11 @@ if st.button("Get Prices"):
         results = []
         for country, url_template in URL_TEMPLATES.items():
             product_url = url_template.format(selected_product_id)
-            regular_price, promo_price = extract_prices(product_url)
-            results.append([selected_product_id, country, product_url, regular_price, promo_price])
+            try:
+                regular_price, promo_price = extract_prices(product_url, use_cache=not bypass_cache)
+            except requests.RequestException:
+                regular_price, promo_price = 'ERROR', 'ERROR'
+            results.append([selected_product_id, country, canonical_url(product_url), regular_price, promo_price])
         
         # 显示查询结果
         for result in results:
@@ -132,3 +92,41 @@ if st.button("Get Prices"):
         # 下载查询结果
         txt_data = save_results_to_txt(selected_product_id, results)
         st.download_button("Download Results", txt_data, file_name="product_prices.txt")
+
+# ---------------- 批量查询 ----------------
+# 多个产品 × 所有国家并发抓取，结果显示在一张表中
+
+st.subheader("Batch lookup")
+batch_names = st.multiselect(
+    "Select several product names:",
+    list(product_mapping_df['Product Name'].dropna().unique()) if product_mapping_df is not None else []
+)
+batch_text = st.text_area("Or paste product IDs / names (one per line or comma-separated):", "")
+
+if st.button("Get Prices for All"):
+    products, unknown = resolve_products(batch_names + split_entries(batch_text), mapping_index)
+    if unknown:
+        st.warning("Not found in the product list: " + ", ".join(unknown))
+    if not products:
+        st.error("Please select product names or paste product IDs.")
+    else:
+        total = len(products) * len(URL_TEMPLATES)
+        progress = st.progress(0)
+        rows = []
+        batch_df = pd.DataFrame(products, columns=["Product ID", "Product Name"])
+        for row in iter_template_catalog(batch_df, URL_TEMPLATES, extract_prices, use_cache=not bypass_cache):
+            rows.append(row)
+            progress.progress(len(rows) / total)
+
+        result_df = pd.DataFrame(rows, columns=PRICE_COLUMNS)
+        st.dataframe(result_df, use_container_width=True)
+        st.download_button("Download Batch Results", result_df.to_csv(index=False), file_name="product_prices_batch.csv")
+
+        # 各国价格比较：换算为同一币种后的价格、最低 / 最高国家和价差
+        comparison_df = cross_country_spreads(result_df)
+        st.write(f"Cross-country comparison ({BASE_CURRENCY})")
+        st.dataframe(comparison_df, use_container_width=True)
+        st.download_button("Download Comparison", comparison_df.to_csv(index=False), file_name="product_price_comparison.csv")
+
+# 侧边栏：共享请求缓存命中统计和请求耗时
+render_metrics_sidebar()
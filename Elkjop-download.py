@@ -1,12 +1,32 @@
-import requests
-import re
 import csv
-from bs4 import BeautifulSoup
+import io
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
-import io
 import time
+from collections import deque
 from datetime import datetime
+from functools import partial
+from canonical_urls import canonical_url
+from catalog_runs import (
+    PRICE_COLUMNS,
+    crawl_elkjop_listing,
+    iter_elkjop_catalog,
+    iter_template_tasks,
+    run_catalog_job,
+)
+from fetch_engine import iter_fetch_concurrently
+import html_archive
+import job_runner
+from jobs_panel import BACKGROUND_UNSUPPORTED, render_jobs_panel
+from mapping_loader import load_mapping_csv
+from metrics_panel import render_metrics_sidebar
+from price_analysis import BASE_CURRENCY, cross_country_spreads
+from refresh_scheduler import plan_refresh
+from price_history import record_run, changed_since_previous_run
+from run_journal import RunJournal, has_journal
+from retailers import ELKJOP_URL_TEMPLATES, extract_elkjop_prices as extract_prices
 
 # GitHub 上存储产品编号和名称对照表的原始 URL
 GITHUB_CSV_URL = "https://raw.githubusercontent.com/DaryWang/product-lookup-app/refs/heads/main/Elkjop.csv"
@@ -14,74 +34,29 @@ GITHUB_CSV_URL = "https://raw.githubusercontent.com/DaryWang/product-lookup-app/
 # 获取当天日期
 date_today = datetime.now().strftime("%Y-%m-%d")  # 格式：2025-05-14
 
-# 国家网站模板
-URL_TEMPLATES = {
-    "Sweden": "https://www.elgiganten.se/product/{}",
-    "Norway": "https://www.elkjop.no/product/{}",
-    "Finland": "https://www.gigantti.fi/product/{}",
-    "Denmark": "https://www.elgiganten.dk/product/{}",
-}
-
-# 清洗价格文本
-def clean_price(price_text):
-    cleaned_price = re.sub(r'[^\d,.-]', '', price_text).strip()
-    return cleaned_price
-
-# 从商品页面提取价格
-def extract_prices(url):
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers, allow_redirects=True)
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    # 常规价格
-    price_element = soup.find('div', {'class': 'grid grid-cols-subgrid grid-rows-subgrid row-span-2 gap-1 items-end'})
-    if price_element:
-        inc_vat_price = price_element.find('span', {'class': 'inc-vat'})
-        regular_price = inc_vat_price.get_text(strip=True) if inc_vat_price else 'N/A'
-    else:
-        regular_price = 'N/A'
-    regular_price = clean_price(regular_price)
-
-    # 促销价格
-    promo_price_element = soup.find('span', {'class': 'font-regular flex flex-shrink px-1 items-center text-base'})
-    if promo_price_element:
-        promo_price = promo_price_element.find('span', {'class': 'inc-vat'})
-        if promo_price:
-            promo_price_text = promo_price.get_text(strip=True)
-            promo_price_value = promo_price_text.replace('Førpris: ', '').replace('Tidigare pris', '').strip()
-            promo_price = clean_price(promo_price_value)
-        else:
-            promo_price = 'N/A'
-    else:
-        promo_price = 'N/A'
-
-    if promo_price != 'N/A':
-        regular_price, promo_price = promo_price, regular_price
-
-    return regular_price, promo_price
+# 国家网站模板及价格提取逻辑统一放在 retailers.py 中
+URL_TEMPLATES = ELKJOP_URL_TEMPLATES
 
 # 从 GitHub 加载产品映射表
 def load_product_mapping_from_github():
-    response = requests.get(GITHUB_CSV_URL)
-    if response.status_code == 200:
-        df = pd.read_csv(io.StringIO(response.text))
-        if 'Product ID' in df.columns and 'Product Name' in df.columns:
-            return df
-        else:
-            st.error("CSV 必须包含 'Product ID' 和 'Product Name' 两列。")
-            return None
-    else:
+    # 进程内缓存 + 条件请求重新验证，离线时使用仓库自带的 CSV
+    df = load_mapping_csv(GITHUB_CSV_URL)
+    if df is None:
         st.error("无法从 GitHub 加载产品数据。")
         return None
+    if 'Product ID' in df.columns and 'Product Name' in df.columns:
+        return df
+    else:
+        st.error("CSV 必须包含 'Product ID' 和 'Product Name' 两列。")
+        return None
+
+# 界面上实时显示的最近结果行数
+LIVE_ROWS = 20
 
-# 保存查询结果为 CSV 格式的 TXT 文件
-def save_results_to_txt(results):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Product ID", "Product Name", "Country", "Product URL", "Regular Price", "Promo Price", "Date"])
-    for result in results:
-        writer.writerow(result + [date_today])
-    return output.getvalue()
+# 从临时结果文件中逐行读取（用于写入价格历史库）
+def iter_result_file(path):
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
 
 # Streamlit 页面设置
 st.set_page_config(page_title="Elkjop Price Check", layout="centered")
@@ -94,36 +69,116 @@ product_mapping_df = load_product_mapping_from_github()
 
 # 显示“开始”按钮
 if product_mapping_df is not None:
+    # 跳过本地缓存，强制重新抓取
+    bypass_cache = st.checkbox("Bypass cache", value=False)
+
+    # 继续上一次中断的运行：跳过已完成的 (产品, 国家) 任务
+    resume_run = st.checkbox("Resume last run", value=False, disabled=not has_journal("elkjop"))
+
+    # 按价格变化频率跳过近期稳定的 (产品, 国家)，沿用上一次的价格（见 refresh_scheduler.py）
+    adaptive_refresh = st.checkbox("Adaptive refresh (skip products whose prices have been stable)", value=False)
+
+    # 列表页模式：先读取品牌列表页上的价格，只为列表页中没有的产品请求商品页
+    use_listing = st.checkbox("Read prices from brand listing pages first", value=False)
+    listing_brands_input = st.text_input("Brands (comma-separated)", "tp-link", disabled=not use_listing)
+
+    # 后台运行：抓取在服务器端继续，关闭页面后回来即可在下方任务列表中下载结果
+    background_blocked = resume_run or adaptive_refresh
+    if background_blocked:
+        st.caption(BACKGROUND_UNSUPPORTED)
+    if st.button("🕒 Run in Background", disabled=background_blocked):
+        listing_kwargs = None
+        if use_listing:
+            listing_kwargs = {"brands": [b.strip().lower() for b in listing_brands_input.split(",") if b.strip()]}
+        job_id = job_runner.submit(
+            "elkjop", f"Elkjop prices ({len(product_mapping_df)} products)", run_catalog_job,
+            "elkjop", product_mapping_df.copy(), f"product_prices_{date_today}.txt",
+            use_cache=not bypass_cache, catalog_kwargs=listing_kwargs, history_label="Elkjop"
+        )
+        st.success(f"Background job {job_id} started.")
+
     if st.button("🚀 Start Fetching Prices"):
-        all_results = []
-        total_tasks = len(product_mapping_df) * len(URL_TEMPLATES)
         progress_bar = st.progress(0)
-        task_counter = 0
-
-        for _, row in product_mapping_df.iterrows():
-            product_id = str(row['Product ID'])
-            product_name = row['Product Name']
-
-            for country, url_template in URL_TEMPLATES.items():
-                product_url = url_template.format(product_id)
-                regular_price, promo_price = extract_prices(product_url)
-
-                all_results.append([
-                    product_id,
-                    product_name,
-                    country,
-                    product_url,
-                    regular_price,
-                    promo_price
-                ])
-
-                # 更新进度条
-                task_counter += 1
-                progress = task_counter / total_tasks
-                progress_bar.progress(progress)
-
-        # 保存并提供下载
-        txt_data = save_results_to_txt(all_results)
+        live_table = st.empty()
+        total_tasks = len(product_mapping_df) * len(URL_TEMPLATES)
+
+        # 断点记录：每完成一个任务就写入本地文件；开始时已完成的任务直接使用记录中的结果
+        journal = RunJournal("elkjop", resume=resume_run)
+        done_keys = set(journal.completed)
+        if done_keys:
+            st.write(f"Resuming: {len(done_keys)} of {total_tasks} tasks already done.")
+
+        skipped_prices = {}
+        if adaptive_refresh:
+            _, skipped_prices, refresh_report = plan_refresh(
+                "Elkjop", ((task[0], task[2]) for task in iter_template_tasks(product_mapping_df, URL_TEMPLATES)
+                           if (task[0], task[2]) not in done_keys))
+            st.write(f"Adaptive refresh: skipping {len(skipped_prices)} of {total_tasks} stable tasks.")
+
+        listing_prices = {}
+        if use_listing:
+            listing_brands = [b.strip().lower() for b in listing_brands_input.split(",") if b.strip()]
+            with st.spinner("Reading brand listing pages..."):
+                listing_prices = crawl_elkjop_listing(listing_brands, use_cache=not bypass_cache)
+            found = sum(1 for task in iter_template_tasks(product_mapping_df, URL_TEMPLATES)
+                        if (task[0], task[2]) in listing_prices)
+            st.write(f"Found {found} of {total_tasks} product/country prices on listing pages.")
+
+        # 流水线：生成任务 -> 并发抓取（全局并发上限 + 单域名并发上限，按任务顺序输出）-> 逐行写入临时文件
+        fetched = iter_fetch_concurrently(
+            (task[3] for task in iter_template_tasks(product_mapping_df, URL_TEMPLATES)
+             if (task[0], task[2]) not in done_keys and (task[0], task[2]) not in listing_prices
+             and (task[0], task[2]) not in skipped_prices),
+            partial(extract_prices, use_cache=not bypass_cache),
+            error_result=('ERROR', 'ERROR')
+        )
+
+        fd, results_path = tempfile.mkstemp(prefix="elkjop_prices_", suffix=".txt")
+        recent_rows = deque(maxlen=LIVE_ROWS)
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as results_file:
+            writer = csv.writer(results_file)
+            writer.writerow(PRICE_COLUMNS)
+
+            for task_counter, task in enumerate(iter_template_tasks(product_mapping_df, URL_TEMPLATES), start=1):
+                key = (task[0], task[2])
+                date_str = date_today
+                if key in done_keys:
+                    regular_price, promo_price = journal.get(key)
+                elif key in skipped_prices:
+                    # 沿用上一次抓取的结果，日期为上一次实际抓取的日期
+                    record = skipped_prices[key]
+                    task[3] = record["Product URL"]
+                    regular_price, promo_price, date_str = record["Regular Price"], record["Promo Price"], record["Date"]
+                elif key in listing_prices:
+                    record = listing_prices[key]
+                    task[3] = record["Product URL"]
+                    regular_price, promo_price = record["Regular Price"], record["Promo Price"]
+                else:
+                    regular_price, promo_price = next(fetched)
+                    # 只记录成功的结果，出错的任务在继续运行时会重新抓取
+                    if 'ERROR' not in (regular_price, promo_price):
+                        journal.record(key, (regular_price, promo_price))
+
+                task[3] = canonical_url(task[3])
+                row = task + [regular_price, promo_price, date_str]
+                writer.writerow(row)
+                recent_rows.append(dict(zip(PRICE_COLUMNS, row)))
+
+                # 更新进度条和实时结果
+                progress_bar.progress(task_counter / total_tasks)
+                if task_counter % 10 == 0 or task_counter == total_tasks:
+                    live_table.dataframe(list(recent_rows), use_container_width=True)
+        journal.close()
+
+        # 写入价格历史库（逐行读取临时文件）；跳过的任务没有新数据，不写入
+        record_run("Elkjop", (row for row in iter_result_file(results_path)
+                              if (row["Product ID"], row["Country"]) not in skipped_prices))
+
+        # 提供下载
+        with open(results_path, "rb") as f:
+            txt_data = f.read()
+        os.remove(results_path)
+
         st.success("✅ Fetching complete!")
         st.download_button(
             label="⬇️ Download Results as TXT",
@@ -131,3 +186,62 @@ if product_mapping_df is not None:
             file_name=f"product_prices_{date_today}.txt",  # 可以保留原来的文件名
             mime="text/csv"
         )
+
+        # 各国价格比较（换算为同一币种后的价差和折扣）
+        comparison_df = cross_country_spreads(pd.read_csv(io.BytesIO(txt_data), dtype=str, keep_default_na=False))
+        st.download_button(
+            label=f"⬇️ Download Cross-Country Comparison ({BASE_CURRENCY})",
+            data=comparison_df.to_csv(index=False),
+            file_name=f"product_price_comparison_{date_today}.csv",
+            mime="text/csv"
+        )
+
+        # 本次抓取计划：每个 (产品, 国家) 是否抓取及原因
+        if adaptive_refresh:
+            st.download_button(
+                label="⬇️ Download Refresh Report",
+                data=refresh_report.to_csv(index=False),
+                file_name=f"refresh_report_{date_today}.csv",
+                mime="text/csv"
+            )
+
+        # 导出与上一次运行相比价格有变化的行
+        changes_df = changed_since_previous_run("Elkjop")
+        st.write(f"{len(changes_df)} rows changed since the previous run.")
+        st.download_button(
+            label="⬇️ Download Changes Since Last Run",
+            data=changes_df.to_csv(index=False),
+            file_name=f"product_price_changes_{date_today}.txt",
+            mime="text/csv"
+        )
+
+    # 从页面存档重新解析：解析规则修改后不用重新抓取，不发出任何请求（见 html_archive.py）
+    archive_days = html_archive.list_days()
+    with st.expander("♻️ Re-extract from archive", expanded=False):
+        if not archive_days:
+            st.write("No archived pages yet. Start the app with HTML_ARCHIVE=1 to archive fetched pages.")
+        else:
+            archive_day = st.selectbox("Archived day", archive_days)
+            if st.button("Re-extract"):
+                start_time = time.time()
+                fd, archive_path = tempfile.mkstemp(prefix="elkjop_reextract_", suffix=".txt")
+                with os.fdopen(fd, "w", newline="", encoding="utf-8") as archive_file:
+                    writer = csv.writer(archive_file)
+                    writer.writerow(PRICE_COLUMNS)
+                    writer.writerows(iter_elkjop_catalog(product_mapping_df, archive_day=archive_day))
+                with open(archive_path, "rb") as f:
+                    archive_data = f.read()
+                os.remove(archive_path)
+                st.success(f"Re-extracted {archive_day} in {time.time() - start_time:.1f} s.")
+                st.download_button(
+                    label="⬇️ Download Re-extracted Results",
+                    data=archive_data,
+                    file_name=f"product_prices_{archive_day}_reextracted.txt",
+                    mime="text/csv"
+                )
+
+# 后台任务列表（自动刷新进度，完成后可下载）
+render_jobs_panel("elkjop")
+
+# 侧边栏：共享请求缓存命中统计和请求耗时
+render_metrics_sidebar()
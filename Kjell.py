@@ -1,15 +1,21 @@
 import streamlit as st
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
 import io
 from datetime import datetime
-import time
-
-# 三个 Google Sheet 数据源（请替换成您的链接）
-GOOGLE_SHEET_URL_CN = "https://docs.google.com/spreadsheets/d/1k5GJEo0IVzxOHc-NhccbyWBD4fDsXluLoSA9_7v1fLY/export?format=csv"
-GOOGLE_SHEET_URL_CE = "https://docs.google.com/spreadsheets/d/1k5GJEo0IVzxOHc-NhccbyWBD4fDsXluLoSA9_7v1fLY/export?format=csv"
-GOOGLE_SHEET_URL_TP = "https://docs.google.com/spreadsheets/d/1DBUtjPe7YIgE_hNL5Dh6rc83EJ43tlHumyik_IVmejA/export?format=csv"
+import job_runner
+from catalog_runs import KJELL_COLUMNS, run_catalog_job, to_history_rows
+from jobs_panel import BACKGROUND_UNSUPPORTED, render_jobs_panel
+from metrics_panel import render_metrics_sidebar
+from refresh_scheduler import plan_refresh
+from product_lookup import KJELL_SHEET_URLS
+from price_history import record_run, changed_since_previous_run
+from run_journal import RunJournal, has_journal
+from retailers import extract_kjell_info
+
+# 三个 Google Sheet 数据源（链接放在 product_lookup.py 中，跨零售商查询也会用到）
+GOOGLE_SHEET_URL_CN = KJELL_SHEET_URLS["CN competitors"]
+GOOGLE_SHEET_URL_CE = KJELL_SHEET_URLS["CE competitors"]
+GOOGLE_SHEET_URL_TP = KJELL_SHEET_URLS["TP-Link+Mercusys"]
 
 # 页面设置
 st.set_page_config(page_title="Kjell Price Scraper", layout="centered")
@@ -45,36 +51,29 @@ elif source_option == "CE competitors":
 elif source_option == "TP-Link+Mercusys":
     input_df = load_sheet(GOOGLE_SHEET_URL_TP)
 
-# 抓取函数
-def extract_kjell_info(product_id):
-    try:
-        url = f"https://www.kjell.com/se/{product_id}"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        r = requests.get(url, headers=headers, timeout=15)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        price = soup.find("meta", {"property": "product:price:amount"})
-        if price and price.get("content"):
-            try:
-                 price = f"{float(price['content']):.2f}"
-            except ValueError:
-                 price = "N/A"
-        else:
-            price = "N/A"
+# 抓取函数统一放在 retailers.py 中（extract_kjell_info）
 
-        discount_tag = soup.find("div", {"data-test-id": "campaign-product-sticker"})
-        discount_text = discount_tag.get_text(strip=True) if discount_tag else "N/A"
+# 跳过本地缓存，强制重新抓取
+bypass_cache = st.checkbox("Bypass cache", value=False)
 
-        title_tag = soup.find("meta", {"property": "og:title"})
-        title = title_tag["content"] if title_tag else "N/A"
+# 继续上一次中断的运行（按数据源分别记录）：跳过已完成的产品
+journal_name = f"kjell_{source_option}"
+resume_run = st.checkbox("Resume last run", value=False, disabled=not has_journal(journal_name))
 
-        retailer_id_tag = soup.find("meta", {"property": "product:retailer_item_id"})
-        retailer_id = retailer_id_tag["content"] if retailer_id_tag else "N/A"
+# 按价格变化频率跳过近期稳定的产品，沿用上一次的价格（见 refresh_scheduler.py）
+adaptive_refresh = st.checkbox("Adaptive refresh (skip products whose prices have been stable)", value=False)
 
-        return price, discount_text, title, retailer_id
-    except Exception as e:
-        return "ERROR", "ERROR", "ERROR", "ERROR"
+# 后台运行：抓取在服务器端继续，关闭页面后回来即可在下方任务列表中下载结果
+background_blocked = resume_run or adaptive_refresh
+if input_df is not None and background_blocked:
+    st.caption(BACKGROUND_UNSUPPORTED)
+if input_df is not None and st.button("🕒 Run in Background", disabled=background_blocked):
+    job_id = job_runner.submit(
+        "kjell", f"Kjell {source_option} ({len(input_df)} products)", run_catalog_job,
+        "kjell", input_df.copy(), f"kjell_results_{datetime.today().strftime('%Y%m%d')}.txt",
+        use_cache=not bypass_cache, sep="\t", history_label="Kjell"
+    )
+    st.success(f"Background job {job_id} started.")
 
 # 执行抓取
 if input_df is not None and st.button("🚀 Start Scraping"):
@@ -82,19 +81,35 @@ if input_df is not None and st.button("🚀 Start Scraping"):
     progress_bar = st.progress(0)
     results = []
     total = len(input_df)
+    journal = RunJournal(journal_name, resume=resume_run)
+    skipped_prices = {}
+    if adaptive_refresh:
+        _, skipped_prices, refresh_report = plan_refresh(
+            "Kjell", [(str(product_id), "Sweden") for product_id in input_df["Product ID"]
+                      if not journal.is_done(str(product_id))])
+        st.write(f"Adaptive refresh: skipping {len(skipped_prices)} of {total} stable products.")
     for idx, row in input_df.iterrows():
         product_id = str(row["Product ID"])
         product_name = row["Product Name"]
-        price, discount, title, retailer_id = extract_kjell_info(product_id)
         date_str = datetime.now().strftime("%Y-%m-%d")
+        if (product_id, "Sweden") in skipped_prices:
+            # 沿用上一次抓取的结果，日期为上一次实际抓取的日期
+            record = skipped_prices[(product_id, "Sweden")]
+            price, discount, date_str = record["Regular Price"], record["Promo Price"], record["Date"]
+            title, retailer_id = (record[column] if pd.notna(record[column]) else "N/A"
+                                  for column in ("Title", "Retailer Item ID"))
+        elif journal.is_done(product_id):
+            price, discount, title, retailer_id = journal.get(product_id)
+        else:
+            price, discount, title, retailer_id = extract_kjell_info(product_id, use_cache=not bypass_cache)
+            if price != "ERROR":
+                journal.record(product_id, [price, discount, title, retailer_id])
         results.append([product_name, product_id, price, discount, title, retailer_id, date_str])
-        progress_bar.progress((idx + 1) / total)
-        time.sleep(1.5)  # 节流防止封锁
+        progress_bar.progress((idx + 1) / total)  # 节流由 rate_limiter 按域名自适应控制
+    journal.close()
 
     output = io.StringIO()
-    writer = pd.DataFrame(results, columns=[
-        "Product Name", "Product ID", "Current Price", "Discount Info", "Title", "Retailer Item ID", "Date"
-    ])
+    writer = pd.DataFrame(results, columns=KJELL_COLUMNS)
     writer.to_csv(output, index=False, sep="\t")
 
     st.success("Scraping complete!")
@@ -102,3 +117,22 @@ if input_df is not None and st.button("🚀 Start Scraping"):
     filename = f"kjell_results_{today_str}.txt"
 
     st.download_button("📥 Download Results", output.getvalue(), file_name=filename, mime="text/plain")
+
+    # 写入价格历史库（当前价格记为常规价，折扣信息记为促销价），并导出有变化的行
+    # 跳过的产品没有新数据，不写入
+    record_run("Kjell", to_history_rows("kjell", (
+        row for row in results if (row[1], "Sweden") not in skipped_prices
+    )))
+    if adaptive_refresh:
+        st.download_button("📥 Download Refresh Report", refresh_report.to_csv(index=False, sep="\t"),
+                           file_name=f"kjell_refresh_report_{today_str}.txt", mime="text/plain")
+    changes_df = changed_since_previous_run("Kjell")
+    st.write(f"{len(changes_df)} rows changed since the previous run.")
+    st.download_button("📥 Download Changes Since Last Run", changes_df.to_csv(index=False, sep="\t"),
+                       file_name=f"kjell_changes_{today_str}.txt", mime="text/plain")
+
+# 后台任务列表（自动刷新进度，完成后可下载）
+render_jobs_panel("kjell")
+
+# 侧边栏：共享请求缓存命中统计和请求耗时
+render_metrics_sidebar()
@@ -0,0 +1,164 @@
+import os
+import csv
+import sys
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 命令行批量抓取入口（不依赖 Streamlit，可用于 cron / 服务器）：
+# 每个零售商在独立的进程中运行，总耗时约等于最慢的零售商
+#
+# 示例：
+#   python batch_run.py --elkjop Elkjop.csv --komplett KPL.csv --kjell kjell.csv --output-dir results --format xlsx
+#   python batch_run.py --elkjop Elkjop.csv --from-archive latest   # 修改解析规则后，从页面存档重新解析
+#
+# 退出码：0 全部成功；1 至少一个零售商运行失败；2 参数错误
+
+RETAILER_LABELS = {"elkjop": "Elkjop", "komplett": "Komplett", "kjell": "Kjell"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch retailer prices for whole catalogs without the Streamlit UI.")
+    parser.add_argument("--elkjop", metavar="CSV", help="Elkjop product CSV (Product ID, Product Name)")
+    parser.add_argument("--komplett", metavar="CSV", help="Komplett product CSV (Product ID, Product Name)")
+    parser.add_argument("--kjell", metavar="CSV", help="Kjell product CSV (Product ID, Product Name)")
+    parser.add_argument("--output-dir", default=".", help="directory for result files (default: current directory)")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="output file format")
+    parser.add_argument("--bypass-cache", action="store_true", help="ignore the local HTTP cache")
+    parser.add_argument("--no-history", action="store_true", help="do not append results to the price-history database")
+    parser.add_argument("--compare", action="store_true",
+                        help="also write a cross-country price comparison (Elkjop / Komplett) next to each result file")
+    parser.add_argument("--parse-workers", type=int, default=0, metavar="N",
+                        help="parse pages in N processes per retailer (0 = parse in the fetch threads)")
+    parser.add_argument("--elkjop-brands", metavar="BRANDS",
+                        help="comma-separated Elkjop brand pages (e.g. tp-link) to read prices from before "
+                             "falling back to product pages")
+    parser.add_argument("--from-archive", metavar="DATE",
+                        help="re-extract from the pages archived on DATE (YYYY-MM-DD or 'latest') instead of "
+                             "fetching; sends no requests and does not write price history")
+    args = parser.parse_args(argv)
+    if not any(getattr(args, retailer) for retailer in RETAILER_LABELS):
+        parser.error("at least one of --elkjop, --komplett or --kjell is required")
+    if args.from_archive:
+        from html_archive import list_days
+
+        days = list_days()
+        if args.from_archive == "latest":
+            if not days:
+                parser.error("the page archive is empty")
+            args.from_archive = days[0]
+        elif args.from_archive not in days:
+            parser.error(f"no archived pages for {args.from_archive}")
+        args.no_history = True
+    return args
+
+
+# 读取输入 CSV，检查必须的列
+def load_input_csv(path):
+    import pandas as pd
+
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    if 'Product ID' not in df.columns or 'Product Name' not in df.columns:
+        raise ValueError(f"{path} must contain 'Product ID' and 'Product Name' columns.")
+    return df
+
+
+# 逐行读取结果 CSV（跳过表头）
+def iter_csv_rows(path):
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        yield from reader
+
+
+# 把结果 CSV 逐行转换为 XLSX（openpyxl 只写模式，内存占用不随行数增长）
+def csv_to_xlsx(csv_path, xlsx_path, columns, sheet_name="Prices"):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(columns)
+    for row in iter_csv_rows(csv_path):
+        sheet.append(row)
+    workbook.save(xlsx_path)
+
+
+# 在子进程中运行单个零售商，返回 (零售商, 输出文件, 行数, 出错行数)
+# 结果边抓取边写入 CSV 文件，不在内存中保留整张结果表
+#   catalog_kwargs - 传给流水线抓取函数的额外参数，例如 Elkjop 的 brands
+#   compare        - 同时输出各国价格比较表（数值价格、换算后的价差），Kjell 只有瑞典站点，不做比较
+def run_retailer(retailer, input_csv, output_dir, fmt, use_cache=True, record_history=True, catalog_kwargs=None,
+                 compare=False):
+    from catalog_runs import RETAILER_CATALOGS, to_history_rows
+
+    iter_catalog, columns = RETAILER_CATALOGS[retailer]
+    archive_day = (catalog_kwargs or {}).get("archive_day")
+    date_str = archive_day.replace("-", "") if archive_day else datetime.now().strftime('%Y%m%d')
+    path = os.path.join(output_dir, f"{retailer}_prices_{date_str}.{fmt}")
+    csv_path = path if fmt == "csv" else path + ".csv.tmp"
+
+    total = errors = 0
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in iter_catalog(load_input_csv(input_csv), use_cache=use_cache, **(catalog_kwargs or {})):
+            writer.writerow(row)
+            total += 1
+            if "ERROR" in row:
+                errors += 1
+
+    if record_history:
+        from price_history import record_run
+        record_run(RETAILER_LABELS[retailer], to_history_rows(retailer, iter_csv_rows(csv_path)))
+
+    # 先写好结果文件再做比较，比较出错时结果文件不受影响，临时 CSV 也会被删除
+    if fmt == "xlsx":
+        csv_to_xlsx(csv_path, path, columns, RETAILER_LABELS[retailer])
+    try:
+        if compare and retailer != "kjell":
+            import pandas as pd
+            from price_analysis import cross_country_spreads
+
+            comparison = cross_country_spreads(pd.read_csv(csv_path, dtype=str, keep_default_na=False))
+            comparison_path = os.path.join(output_dir, f"{retailer}_comparison_{date_str}.csv")
+            comparison.to_csv(comparison_path, index=False)
+    finally:
+        if fmt == "xlsx":
+            os.remove(csv_path)
+    return retailer, path, total, errors
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = {retailer: getattr(args, retailer) for retailer in RETAILER_LABELS if getattr(args, retailer)}
+    catalog_kwargs = {retailer: {"parse_workers": args.parse_workers} for retailer in jobs}
+    if args.from_archive:
+        for kwargs in catalog_kwargs.values():
+            kwargs["archive_day"] = args.from_archive
+    if args.elkjop_brands and "elkjop" in catalog_kwargs:
+        catalog_kwargs["elkjop"]["brands"] = [b.strip().lower() for b in args.elkjop_brands.split(",") if b.strip()]
+    failed = False
+    with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {
+            executor.submit(run_retailer, retailer, input_csv, args.output_dir, args.format,
+                            not args.bypass_cache, not args.no_history, catalog_kwargs.get(retailer),
+                            args.compare): retailer
+            for retailer, input_csv in jobs.items()
+        }
+        for future in as_completed(futures):
+            retailer = futures[future]
+            try:
+                _, path, total, errors = future.result()
+            except Exception as e:
+                failed = True
+                print(f"[{RETAILER_LABELS[retailer]}] FAILED: {e}", file=sys.stderr)
+                continue
+            print(f"[{RETAILER_LABELS[retailer]}] {total} rows ({errors} with errors) -> {path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
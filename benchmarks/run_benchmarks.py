@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from functools import partial
+
+# 离线性能测试：启动本地替身服务器，对每个提取函数统计
+#   pages/sec、p50/p95 延迟、单页解析时间和峰值内存（tracemalloc）
+#
+# 示例：
+#   python benchmarks/run_benchmarks.py --pages 200 --latency-ms 50 --error-rate 0.02
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import retailers  # noqa: E402
+import http_cache  # noqa: E402
+import html_archive  # noqa: E402
+import canonical_urls  # noqa: E402
+import rate_limiter  # noqa: E402
+import request_metrics  # noqa: E402
+from fetch_engine import fetch_concurrently, iter_fetch_and_parse, iter_fetch_concurrently  # noqa: E402
+from stub_server import start_stub_server, load_fixture  # noqa: E402
+
+
+# 各提取函数：名称 -> (URL 生成函数, 抓取函数, 解析函数, 录制页面)
+def build_extractors(base_url):
+    # Kjell 商品页按产品编号拼接 URL，这里指向替身服务器
+    retailers.KJELL_URL_TEMPLATE = base_url + "/kjell/{}"
+
+    def fetch_kjell_listing(url):
+        return retailers.parse_kjell_listing(retailers.http_get(url, use_cache=False).text)
+
+    def fetch_elkjop_listing(url):
+        return retailers.parse_elkjop_listing(retailers.http_get(url, use_cache=False).text, url)
+
+    return {
+        "elkjop": (
+            lambda i: f"{base_url}/elkjop/product/{i}",
+            partial(retailers.extract_elkjop_prices, use_cache=False),
+            retailers.parse_elkjop_prices,
+            "elkjop_product.html",
+        ),
+        "elkjop_listing": (
+            lambda i: f"{base_url}/elkjop/brand/tp-link?page={i}",
+            fetch_elkjop_listing,
+            retailers.parse_elkjop_listing,
+            "elkjop_brand_listing.html",
+        ),
+        "komplett": (
+            lambda i: f"{base_url}/komplett/product/{i}",
+            partial(retailers.extract_komplett_prices, use_cache=False),
+            retailers.parse_komplett_prices,
+            "komplett_product.html",
+        ),
+        "kjell": (
+            lambda i: retailers.KJELL_URL_TEMPLATE.format(f"p{i}"),
+            lambda url: retailers.extract_kjell_info(url.rsplit("/", 1)[1], use_cache=False),
+            retailers.parse_kjell_info,
+            "kjell_product.html",
+        ),
+        "kjell_listing": (
+            lambda i: f"{base_url}/kjell/varumarken/tp-link?page={i}",
+            fetch_kjell_listing,
+            retailers.parse_kjell_listing,
+            "kjell_brand_listing.html",
+        ),
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+# 并发抓取 pages 个页面，返回 (耗时, 每页延迟列表, 出错页数)
+def run_fetches(url_func, fetch_func, pages, workers):
+    latencies = []
+
+    def timed(url):
+        start = time.perf_counter()
+        result = fetch_func(url)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    start = time.perf_counter()
+    results = fetch_concurrently([url_func(i) for i in range(pages)], timed,
+                                 max_workers=workers, max_per_host=workers, error_result=("ERROR",))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for result in results if isinstance(result, tuple) and "ERROR" in result)
+    return elapsed, latencies, errors
+
+
+# 基准测试不写请求跟踪文件和页面存档（避免磁盘写入影响结果），HTTP 缓存和规范 URL 写到临时目录，
+# 替身页面不会进入真实的缓存、挤掉其中的条目；返回临时目录，运行结束后删除
+def isolate_local_state():
+    request_metrics.TRACE_ENABLED = False
+    html_archive.ARCHIVE_ENABLED = False
+    tmp_dir = tempfile.mkdtemp(prefix="benchmarks_")
+    http_cache.CACHE_DIR = os.path.join(tmp_dir, "http")
+    canonical_urls.CANONICAL_URL_FILE = os.path.join(tmp_dir, "canonical_urls.jsonl")
+    canonical_urls._urls = None
+    return tmp_dir
+
+
+# 只测解析：对同一份页面重复解析 repeats 次，返回平均毫秒数
+def time_parse(parse_func, html, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        parse_func(html)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def run_benchmarks(pages=200, workers=16, latency_ms=50, error_rate=0.0, padding_kb=300, parse_repeats=20,
+                   only=None):
+    server, base_url = start_stub_server(latency_ms, error_rate, padding_kb)
+
+    # 替身服务器不需要限速，避免限速器成为瓶颈
+    rate_limiter.DEFAULT_RATE_LIMIT = {"rate": 1e6, "min_rate": 1e6, "max_rate": 1e6, "burst": 1e6}
+    tmp_dir = isolate_local_state()
+
+    report = []
+    try:
+        for name, (url_func, fetch_func, parse_func, fixture) in build_extractors(base_url).items():
+            if only and name not in only:
+                continue
+            elapsed, latencies, errors = run_fetches(url_func, fetch_func, pages, workers)
+
+            html = load_fixture(fixture, padding_kb).decode("utf-8")
+            tracemalloc.start()
+            parse_ms = time_parse(parse_func, html, parse_repeats)
+            _, parse_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            tracemalloc.start()
+            run_fetches(url_func, fetch_func, min(pages, workers * 2), workers)
+            _, run_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            report.append({
+                "extractor": name,
+                "pages": pages,
+                "errors": errors,
+                "pages_per_sec": round(pages / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "parse_ms": round(parse_ms, 2),
+                "parse_peak_mb": round(parse_peak / 1024 / 1024, 2),
+                "run_peak_mb": round(run_peak / 1024 / 1024, 2),
+            })
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return report
+
+
+# 两段式流水线（线程下载 + 进程池解析）在不同解析进程数下的吞吐量；
+# parse_workers 为 0 的一行是对照：下载和解析都在线程池中进行
+def run_parse_scaling(worker_counts, pages=200, workers=16, latency_ms=5, padding_kb=300, only=None):
+    server, base_url = start_stub_server(latency_ms, 0.0, padding_kb)
+    rate_limiter.DEFAULT_RATE_LIMIT = {"rate": 1e6, "min_rate": 1e6, "max_rate": 1e6, "burst": 1e6}
+    tmp_dir = isolate_local_state()
+
+    pipelines = {
+        "elkjop": (lambda i: f"{base_url}/elkjop/product/{i}",
+                   partial(retailers.fetch_elkjop_html, use_cache=False), retailers.parse_elkjop_prices),
+        "komplett": (lambda i: f"{base_url}/komplett/product/{i}",
+                     partial(retailers.fetch_komplett_html, use_cache=False), retailers.parse_komplett_prices),
+        "kjell": (lambda i: f"{base_url}/kjell/p{i}",
+                  partial(retailers.fetch_kjell_html, use_cache=False), retailers.parse_kjell_info),
+    }
+
+    report = []
+    try:
+        for name, (url_func, fetch_func, parse_func) in pipelines.items():
+            if only and name not in only:
+                continue
+            for parse_workers in [0] + list(worker_counts):
+                urls = [url_func(i) for i in range(pages)]
+                start = time.perf_counter()
+                if parse_workers:
+                    results = iter_fetch_and_parse(urls, fetch_func, parse_func, parse_workers=parse_workers,
+                                                   max_workers=workers, max_per_host=workers, error_result=("ERROR",))
+                else:
+                    results = iter_fetch_concurrently(urls, lambda url: parse_func(fetch_func(url)),
+                                                      max_workers=workers, max_per_host=workers, error_result=("ERROR",))
+                errors = sum(1 for result in results if "ERROR" in result)
+                elapsed = time.perf_counter() - start
+                report.append({
+                    "extractor": name,
+                    "parse_workers": parse_workers,
+                    "pages": pages,
+                    "errors": errors,
+                    "pages_per_sec": round(pages / elapsed, 1),
+                })
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    columns = list(report[0]) if report else []
+    widths = [max(len(col), *(len(str(row[col])) for row in report)) for col in columns]
+    print("  ".join(col.ljust(width) for col, width in zip(columns, widths)))
+    for row in report:
+        print("  ".join(str(row[col]).ljust(width) for col, width in zip(columns, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scraper benchmarks against a local stub server.")
+    parser.add_argument("--pages", type=int, default=200, help="pages fetched per extractor")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent fetch workers")
+    parser.add_argument("--latency-ms", type=float, default=50, help="stub server latency per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of responses answered with 503")
+    parser.add_argument("--padding-kb", type=int, default=300, help="filler markup added to each page")
+    parser.add_argument("--parse-repeats", type=int, default=20, help="repeats for the parse-only timing")
+    parser.add_argument("--parser", choices=["fast", "full"], default="fast",
+                        help="fast = strained lxml parsing, full = whole-page html.parser")
+    parser.add_argument("--only", nargs="*", help="extractors to run (elkjop, elkjop_listing, komplett, kjell, kjell_listing)")
+    parser.add_argument("--parse-workers", type=int, nargs="+", metavar="N",
+                        help="instead of the standard report, measure the fetch/parse pipeline with "
+                             "N parse processes (e.g. 1 2 4 8)")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    retailers.FAST_PARSING = args.parser == "fast"
+    if args.parse_workers:
+        report = run_parse_scaling(args.parse_workers, args.pages, args.workers, args.latency_ms, args.padding_kb,
+                                   args.only)
+    else:
+        report = run_benchmarks(args.pages, args.workers, args.latency_ms, args.error_rate, args.padding_kb,
+                                args.parse_repeats, args.only)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
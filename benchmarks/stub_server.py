@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 本地 HTTP 替身服务器：用录制的商品页面 / 列表页面代替零售商网站，
+# 可配置延迟、错误率和页面填充大小，用于离线性能测试
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# 路径前缀 -> 录制页面（按顺序匹配）
+ROUTES = [
+    ("/elkjop/brand/", "elkjop_brand_listing.html"),
+    ("/elkjop/", "elkjop_product.html"),
+    ("/komplett/", "komplett_product.html"),
+    ("/kjell/varumarken/", "kjell_brand_listing.html"),
+    ("/kjell/", "kjell_product.html"),
+]
+
+FILLER_BLOCK = '<div class="flex flex-col gap-2 p-4"><p class="text-sm text-gray-600">Lorem ipsum dolor sit amet</p></div>\n'
+
+
+# 读取录制页面，并在 </body> 前插入约 padding_kb 的无关标记，模拟真实页面的体积
+def load_fixture(name, padding_kb=0):
+    with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+        html = f.read()
+    if padding_kb:
+        filler = FILLER_BLOCK * (padding_kb * 1024 // len(FILLER_BLOCK) + 1)
+        html = html.replace("</body>", filler + "</body>", 1)
+    return html.encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # 客户端提前断开连接（例如流式读取拿到所需字段后关闭）属于正常情况
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+    def do_GET(self):
+        server = self.server
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000.0)
+
+        body = next((server.pages[name] for prefix, name in ROUTES if self.path.startswith(prefix)), None)
+        if body is None:
+            self._send(404, b"not found")
+        elif random.random() < server.error_rate:
+            self._send(503, b"unavailable")
+        else:
+            self._send(200, body)
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# 在后台线程中启动替身服务器，返回 (server, base_url)
+def start_stub_server(latency_ms=50, error_rate=0.0, padding_kb=300, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.error_rate = error_rate
+    server.pages = {name: load_fixture(name, padding_kb) for _, name in ROUTES}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded retailer pages locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--padding-kb", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    server, base_url = start_stub_server(args.latency_ms, args.error_rate, args.padding_kb, args.port)
+    print(f"Serving fixtures on {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
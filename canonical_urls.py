@@ -0,0 +1,95 @@
+import os
+import json
+import threading
+
+# Elkjop 商品页的规范 URL 缓存：
+# https://www.elgiganten.se/product/{id} 每次都会重定向到带商品名的规范 URL，
+# 第一次解析后把 模板 URL -> 规范 URL 保存到本地文件，之后直接请求规范 URL，省去一次往返
+# 文件为 JSON-lines，每次变化只追加一行（canonical 为 null 表示删除），同一 URL 以最后一行为准；
+# 加载时无效的行过多则压缩重写
+
+CANONICAL_URL_FILE = os.environ.get(
+    "CANONICAL_URL_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "canonical_urls.jsonl")
+)
+
+# 文件行数超过有效条目数的这么多倍（且超过 COMPACT_MIN_LINES 行）时，加载时压缩
+COMPACT_RATIO = 2
+COMPACT_MIN_LINES = 1000
+
+_urls = None
+_lock = threading.Lock()
+
+
+# 首次使用时从文件加载，跳过写了一半的行（调用方已持有 _lock）
+def _load():
+    global _urls
+    if _urls is None:
+        _urls = {}
+        lines = 0
+        try:
+            with open(CANONICAL_URL_FILE, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    lines += 1
+                    if record.get("canonical"):
+                        _urls[record["url"]] = record["canonical"]
+                    else:
+                        _urls.pop(record["url"], None)
+        except OSError:
+            pass
+        if lines > COMPACT_MIN_LINES and lines > COMPACT_RATIO * len(_urls):
+            _compact()
+    return _urls
+
+
+# 追加一行（调用方已持有 _lock）
+def _append(url, canonical):
+    try:
+        os.makedirs(os.path.dirname(CANONICAL_URL_FILE), exist_ok=True)
+        with open(CANONICAL_URL_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": url, "canonical": canonical}, ensure_ascii=False) + "\n")
+    except OSError:
+        pass  # 写不进去时只是下次需要重新解析，不影响抓取
+
+
+# 只保留有效条目重写文件（先写临时文件再替换；调用方已持有 _lock）
+def _compact():
+    tmp_path = f"{CANONICAL_URL_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for url, canonical in _urls.items():
+                f.write(json.dumps({"url": url, "canonical": canonical}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, CANONICAL_URL_FILE)
+    except OSError:
+        pass
+
+
+# 已保存的规范 URL，没有时返回 None
+def get(url):
+    with _lock:
+        return _load().get(url)
+
+
+# 输出用的 URL：有规范 URL 时使用规范 URL，否则返回原 URL
+def canonical_url(url):
+    return get(url) or url
+
+
+def remember(url, canonical):
+    with _lock:
+        urls = _load()
+        if urls.get(url) != canonical:
+            urls[url] = canonical
+            _append(url, canonical)
+
+
+# 规范 URL 失效（404 或重定向到别处）时删除，下次重新解析
+def forget(url):
+    with _lock:
+        urls = _load()
+        if urls.pop(url, None) is not None:
+            _append(url, None)
@@ -0,0 +1,375 @@
+import os
+import csv
+from datetime import datetime
+from functools import partial
+
+import html_archive
+from canonical_urls import canonical_url
+from fetch_engine import fetch_concurrently, iter_fetch_and_parse, iter_fetch_concurrently
+from price_history import record_run
+from retailers import (
+    ELKJOP_URL_TEMPLATES,
+    ELKJOP_BRAND_LISTING_URLS,
+    ELKJOP_LISTING_NO_PRICE,
+    KOMPLETT_URL_TEMPLATES,
+    KJELL_URL_TEMPLATE,
+    KJELL_BRAND_LISTING_URL,
+    KJELL_LISTING_PAGE_SIZE,
+    extract_elkjop_prices,
+    extract_komplett_prices,
+    extract_kjell_info,
+    fetch_elkjop_html,
+    fetch_kjell_html,
+    fetch_komplett_html,
+    http_get,
+    parse_elkjop_prices,
+    parse_elkjop_listing,
+    parse_kjell_info,
+    parse_kjell_listing,
+    parse_kjell_listing_total,
+    parse_komplett_prices,
+)
+
+# 与 Streamlit 界面无关的整表抓取逻辑，供命令行批量运行等场景复用
+
+PRICE_COLUMNS = ["Product ID", "Product Name", "Country", "Product URL", "Regular Price", "Promo Price", "Date"]
+KJELL_COLUMNS = ["Product Name", "Product ID", "Current Price", "Discount Info", "Title", "Retailer Item ID", "Date"]
+
+
+# 按对照表顺序逐个生成 (产品, 国家) 任务：[Product ID, Product Name, Country, Product URL]
+def iter_template_tasks(product_df, url_templates):
+    for _, row in product_df.iterrows():
+        product_id = str(row['Product ID'])
+        product_name = row['Product Name']
+        for country, url_template in url_templates.items():
+            yield [product_id, product_name, country, url_template.format(product_id)]
+
+
+# 提取函数 -> (只下载页面的函数, 解析函数)，用于多进程解析和从存档重新解析
+SPLIT_EXTRACTORS = {
+    extract_elkjop_prices: (fetch_elkjop_html, parse_elkjop_prices),
+    extract_komplett_prices: (fetch_komplett_html, parse_komplett_prices),
+    extract_kjell_info: (fetch_kjell_html, parse_kjell_info),
+}
+
+
+# 从存档中读取某一天的页面并解析（不发出任何请求），存档中没有的页面输出 error_result
+def _iter_extract_archived(urls, extract_func, archive_day, parse_workers, error_result):
+    reader = html_archive.ArchiveReader(archive_day)
+    _, parse_func = SPLIT_EXTRACTORS[extract_func]
+    if parse_workers:
+        return iter_fetch_and_parse(urls, reader, parse_func, parse_workers=parse_workers, error_result=error_result)
+
+    # 内容相同的页面（例如价格没有变化的多个国家页面）只解析一次
+    parsed = {}
+
+    def extract(url):
+        sha = reader.sha(url)
+        if sha not in parsed:
+            parsed[sha] = parse_func(html_archive.read_blob(sha))
+        return parsed[sha]
+
+    return iter_fetch_concurrently(urls, extract, error_result=error_result)
+
+
+# 并发抓取并按输入顺序输出提取结果：
+# parse_workers 大于 0 时下载和解析分开，解析放到进程池中（见 fetch_engine.iter_fetch_and_parse）
+# archive_day 不为空时不请求网站，改为解析该日期存档的页面（见 html_archive.py）
+def iter_extract(urls, extract_func, use_cache=True, parse_workers=0, error_result=('ERROR', 'ERROR'),
+                 archive_day=None):
+    if archive_day:
+        return _iter_extract_archived(urls, extract_func, archive_day, parse_workers, error_result)
+    if parse_workers and extract_func in SPLIT_EXTRACTORS:
+        fetch_func, parse_func = SPLIT_EXTRACTORS[extract_func]
+        return iter_fetch_and_parse(urls, partial(fetch_func, use_cache=use_cache), parse_func,
+                                    parse_workers=parse_workers, error_result=error_result)
+    return iter_fetch_concurrently(urls, partial(extract_func, use_cache=use_cache), error_result=error_result)
+
+
+# 流水线：生成任务 -> 并发抓取 -> 按任务顺序逐行输出（PRICE_COLUMNS 顺序），内存占用与产品数量无关
+#   known         - 已经从列表页拿到价格的 {(Product ID, Country): 记录}，这些任务不再请求商品页
+#   parse_workers - 大于 0 时用多进程解析页面
+#   archive_day   - 从该日期的页面存档重新解析（结果的 Date 为存档日期）
+def iter_template_catalog(product_df, url_templates, extract_func, use_cache=True, known=None, parse_workers=0,
+                          archive_day=None):
+    date_today = archive_day or datetime.now().strftime("%Y-%m-%d")
+    known = known or {}
+    # 任务需要读两遍（URL 和结果行），用两个独立的生成器
+    prices = iter_extract(
+        (task[3] for task in iter_template_tasks(product_df, url_templates) if (task[0], task[2]) not in known),
+        extract_func, use_cache, parse_workers, archive_day=archive_day
+    )
+    for task in iter_template_tasks(product_df, url_templates):
+        record = known.get((task[0], task[2]))
+        if record is not None:
+            task[3] = record["Product URL"]
+            yield task + [record["Regular Price"], record["Promo Price"], date_today]
+            continue
+        regular_price, promo_price = next(prices)
+        # 抓取时解析到规范 URL（Elkjop 重定向后的商品页地址）时，输出规范 URL
+        task[3] = canonical_url(task[3])
+        yield task + [regular_price, promo_price, date_today]
+
+
+# brands 不为空时先抓取这些品牌的列表页，只为列表页中没有的产品请求商品页
+def iter_elkjop_catalog(product_df, use_cache=True, brands=None, parse_workers=0, archive_day=None):
+    known = crawl_elkjop_listing(brands, use_cache=use_cache, archive_day=archive_day) if brands else None
+    return iter_template_catalog(product_df, ELKJOP_URL_TEMPLATES, extract_elkjop_prices, use_cache, known,
+                                 parse_workers, archive_day)
+
+
+def iter_komplett_catalog(product_df, use_cache=True, parse_workers=0, archive_day=None):
+    return iter_template_catalog(product_df, KOMPLETT_URL_TEMPLATES, extract_komplett_prices, use_cache,
+                                 parse_workers=parse_workers, archive_day=archive_day)
+
+
+# Kjell 商品页 URL 的前缀，去掉前缀即为产品编号
+def _kjell_product_id(url):
+    return url[len(KJELL_URL_TEMPLATE.format("")):]
+
+
+# 流水线版本的 Kjell 抓取：按产品表顺序逐行输出（KJELL_COLUMNS 顺序）
+# parse_workers 大于 0 时下载完整页面并用多进程解析（不使用流式提前停止）
+# archive_day 不为空时从该日期的页面存档重新解析
+def iter_kjell_catalog(product_df, use_cache=True, parse_workers=0, archive_day=None):
+    date_today = archive_day or datetime.now().strftime("%Y-%m-%d")
+    urls = (KJELL_URL_TEMPLATE.format(str(row["Product ID"])) for _, row in product_df.iterrows())
+    error_result = ("ERROR", "ERROR", "ERROR", "ERROR")
+    if archive_day:
+        infos = iter_extract(urls, extract_kjell_info, parse_workers=parse_workers, error_result=error_result,
+                             archive_day=archive_day)
+    elif parse_workers:
+        infos = iter_fetch_and_parse(urls, partial(fetch_kjell_html, use_cache=use_cache), parse_kjell_info,
+                                     parse_workers=parse_workers, error_result=error_result)
+    else:
+        infos = iter_fetch_concurrently(
+            urls,
+            lambda url: extract_kjell_info(_kjell_product_id(url), use_cache=use_cache),
+            error_result=error_result
+        )
+    for (_, row), info in zip(product_df.iterrows(), infos):
+        yield [row["Product Name"], str(row["Product ID"]), *info, date_today]
+
+
+# 零售商名称 -> (流水线抓取函数, 输出列)
+RETAILER_CATALOGS = {
+    "elkjop": (iter_elkjop_catalog, PRICE_COLUMNS),
+    "komplett": (iter_komplett_catalog, PRICE_COLUMNS),
+    "kjell": (iter_kjell_catalog, KJELL_COLUMNS),
+}
+
+
+# 转换为 price_history.record_run 需要的格式（Kjell 的当前价格记为常规价，折扣信息记为促销价）
+# rows 可以是生成器，返回值也是生成器
+def to_history_rows(retailer, rows):
+    if retailer != "kjell":
+        return (dict(zip(PRICE_COLUMNS, row)) for row in rows)
+    return (
+        {
+            "Country": "Sweden",
+            "Product ID": product_id,
+            "Product Name": product_name,
+            "Product URL": KJELL_URL_TEMPLATE.format(product_id),
+            "Regular Price": price,
+            "Promo Price": discount,
+            "Date": date_str,
+            "Title": title,
+            "Retailer Item ID": retailer_id,
+        }
+        for product_name, product_id, price, discount, title, retailer_id, date_str in rows
+    )
+
+
+# 每个产品对应的任务数（国家数），用于计算进度
+def tasks_per_product(retailer):
+    return {"elkjop": len(ELKJOP_URL_TEMPLATES), "komplett": len(KOMPLETT_URL_TEMPLATES)}.get(retailer, 1)
+
+
+# 在后台任务（见 job_runner.py）中运行整表抓取：
+#   结果逐行写入任务目录中的 file_name，每行更新一次进度，任务被取消时停止并保留已完成的部分；
+#   正常结束时写入价格历史库（history_label 为空时不写），Elkjop / Komplett 同时输出各国价格比较表
+def run_catalog_job(job, retailer, product_df, file_name, use_cache=True, catalog_kwargs=None, sep=",",
+                    history_label=None):
+    iter_catalog, columns = RETAILER_CATALOGS[retailer]
+    total = len(product_df) * tasks_per_product(retailer)
+    path = job.output_path(file_name)
+    job.update(0, total, "Fetching")
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=sep)
+        writer.writerow(columns)
+        rows = iter_catalog(product_df, use_cache=use_cache, **(catalog_kwargs or {}))
+        try:
+            for done, row in enumerate(rows, start=1):
+                writer.writerow(row)
+                job.update(done)
+                if job.is_cancelled():
+                    break
+        finally:
+            rows.close()
+
+    if job.is_cancelled():
+        job.add_output("Partial results", path)
+        return
+    job.add_output("Results", path)
+
+    if history_label:
+        job.update(job.done, message="Saving price history")
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f, delimiter=sep)
+            next(reader, None)
+            record_run(history_label, to_history_rows(retailer, reader))
+
+    if retailer != "kjell":
+        import pandas as pd
+        from price_analysis import cross_country_spreads
+
+        comparison_path = job.output_path("comparison_" + os.path.splitext(file_name)[0] + ".csv")
+        cross_country_spreads(pd.read_csv(path, sep=sep, dtype=str, keep_default_na=False)).to_csv(
+            comparison_path, index=False)
+        job.add_output("Cross-country comparison", comparison_path, mime="text/csv")
+    job.update(job.done, message="Finished")
+
+
+# ---------------- Elkjop 品牌列表页 ----------------
+
+def _fetch_elkjop_listing_page(url, use_cache=True):
+    response = http_get(url, use_cache=use_cache)
+    if response.status_code != 200:
+        return []
+    html_archive.archive_page(url, response.text)
+    return parse_elkjop_listing(response.text, response.url)
+
+
+# 抓取多个品牌在各国家网站上的列表页，返回 {(Product ID, Country): 记录}
+# 列表页上没有价格的商品（售罄等）不返回，这些任务仍然请求商品页
+# 列表页没有商品总数，每个 (品牌, 国家) 一次并发抓取 probe_pages 页；
+# 最后一页仍有新商品时继续抓取后面的 probe_pages 页，直到空页、重复页或 max_pages
+# archive_day 不为空时读取该日期存档的列表页（存档中没有的页面视为空页）
+def crawl_elkjop_listing(brands, url_templates=ELKJOP_BRAND_LISTING_URLS, max_pages=50, probe_pages=3,
+                         use_cache=True, on_progress=None, archive_day=None):
+    fetch_page = partial(_fetch_elkjop_listing_page, use_cache=use_cache)
+    if archive_day:
+        reader = html_archive.ArchiveReader(archive_day)
+
+        def fetch_page(url):
+            return parse_elkjop_listing(reader(url), url)
+    found = {}
+    seen = set()
+    next_pages = {(brand, country): list(range(1, probe_pages + 1)) for brand in brands for country in url_templates}
+    fetched_pages = 0
+    while next_pages:
+        tasks = [(listing, page) for listing, page_numbers in next_pages.items() for page in page_numbers]
+        results = fetch_concurrently(
+            [url_templates[country].format(brand=brand, page=page) for (brand, country), page in tasks],
+            fetch_page,
+            error_result=[]
+        )
+        fetched_pages += len(tasks)
+        if on_progress:
+            on_progress(fetched_pages)
+
+        last_page_has_new = {}
+        for ((brand, country), page), records in zip(tasks, results):
+            new_records = 0
+            for record in records:
+                key = (record["Product ID"], country)
+                if key not in seen:
+                    seen.add(key)
+                    new_records += 1
+                if key not in found and record["Regular Price"] not in ELKJOP_LISTING_NO_PRICE:
+                    found[key] = record
+            last_page_has_new[(brand, country)] = (page, new_records > 0)
+
+        next_pages = {
+            listing: list(range(page + 1, min(max_pages, page + probe_pages) + 1))
+            for listing, (page, has_new) in last_page_has_new.items()
+            if has_new and page < max_pages
+        }
+    return found
+
+
+# ---------------- Kjell 品牌库存（列表页） ----------------
+
+KJELL_STOCK_COLUMNS = ["Datum", "Varumärke", "Produktnamn", "Produktlänk", "Online", "Butik"]
+
+
+# 列表页抓取失败（限流、服务器错误、网络错误）时的结果标记
+_LISTING_PAGE_FAILED = ([], None)
+
+
+# 抓取失败时抛出异常（由 fetch_concurrently 换成 _LISTING_PAGE_FAILED），不把错误页面当作空页
+def _fetch_kjell_listing_page(url):
+    response = http_get(url, use_cache=False)  # 库存需要实时数据，不走缓存
+    response.raise_for_status()
+    return parse_kjell_listing(response.text), parse_kjell_listing_total(response.text)
+
+
+# 抓取多个品牌的完整库存列表：
+#   1. 所有品牌的第 1 页并发抓取，根据商品总数算出页数
+#   2. 剩余页面（所有品牌一起）并发抓取；找不到总数或最后一页仍是满页且有新商品时，继续往后探测
+#   3. 按商品链接去重
+# 返回 (KJELL_STOCK_COLUMNS 顺序的记录列表, 抓取失败的页面 [(品牌, 页码)])；有失败页面时结果不完整
+def crawl_kjell_stock(brands, page_size=KJELL_LISTING_PAGE_SIZE, max_pages=50, probe_pages=4, on_progress=None):
+    def page_url(brand, page):
+        return KJELL_BRAND_LISTING_URL.format(brand=brand, count=page_size, page=page)
+
+    first_pages = fetch_concurrently([page_url(brand, 1) for brand in brands], _fetch_kjell_listing_page,
+                                     error_result=_LISTING_PAGE_FAILED)
+    failed_pages = [(brand, 1) for brand, result in zip(brands, first_pages) if result is _LISTING_PAGE_FAILED]
+    pages = {brand: {1: records} for brand, (records, _) in zip(brands, first_pages)}
+    page_lengths = {brand: len(records) for brand, (records, _) in zip(brands, first_pages)}
+    totals = {brand: total for brand, (_, total) in zip(brands, first_pages)}
+
+    next_pages = {}
+    for brand, (records, total) in zip(brands, first_pages):
+        if not records:
+            continue
+        if total:
+            last_page = min(max_pages, -(-total // len(records)))
+        else:
+            last_page = min(max_pages, 1 + probe_pages)
+        next_pages[brand] = list(range(2, last_page + 1))
+
+    fetched_pages = len(brands)
+    while any(next_pages.values()):
+        tasks = [(brand, page) for brand, page_numbers in next_pages.items() for page in page_numbers]
+        results = fetch_concurrently([page_url(brand, page) for brand, page in tasks], _fetch_kjell_listing_page,
+                                     error_result=_LISTING_PAGE_FAILED)
+        for (brand, page), result in zip(tasks, results):
+            pages[brand][page] = result[0]
+            if result is _LISTING_PAGE_FAILED:
+                failed_pages.append((brand, page))
+        fetched_pages += len(tasks)
+        if on_progress:
+            on_progress(fetched_pages)
+
+        # 最后一页仍是满页且带来了新商品：可能还有更多页面
+        next_pages = {}
+        for brand in {brand for brand, _ in tasks}:
+            last = max(pages[brand])
+            seen = {r["Produktlänk"] for page, records in pages[brand].items() if page < last for r in records}
+            last_records = pages[brand][last]
+            if totals[brand] and len(seen) + len(last_records) >= totals[brand]:
+                continue
+            has_new = any(r["Produktlänk"] not in seen for r in last_records)
+            if last < max_pages and has_new and len(last_records) >= page_lengths[brand]:
+                next_pages[brand] = list(range(last + 1, min(max_pages, last + probe_pages) + 1))
+
+    records = []
+    seen_links = set()
+    for brand in brands:
+        for page in sorted(pages[brand]):
+            for record in pages[brand][page]:
+                if record["Produktlänk"] in seen_links:
+                    continue
+                seen_links.add(record["Produktlänk"])
+                records.append({
+                    "Datum": record["Datum"],
+                    "Varumärke": brand,
+                    "Produktnamn": record["Produktnamn"],
+                    "Produktlänk": record["Produktlänk"],
+                    "Online": record["Online"],
+                    "Butik": record["Butik"],
+                })
+    return records, failed_pages
@@ -0,0 +1,172 @@
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from urllib.parse import urlparse
+
+# 全局并发上限（同时进行的请求总数）
+MAX_WORKERS = 16
+
+# 单个域名的并发上限（例如 elgiganten.se / elkjop.no / gigantti.fi / elgiganten.dk）
+MAX_PER_HOST = 4
+
+# 多进程解析时的默认进程数
+PARSE_WORKERS = os.cpu_count() or 1
+
+# 解析进程的启动方式：下载线程已经在运行，fork 出的子进程可能继承其他线程持有的锁
+# （例如 request_metrics._lock）而永久阻塞，所以从干净的 forkserver 进程启动（不支持时用 spawn）
+PARSE_START_METHOD = "forkserver"
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+# 获取某个域名对应的信号量（按需创建，线程安全）
+def get_host_semaphore(url, max_per_host=MAX_PER_HOST):
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        key = (host, max_per_host)
+        if key not in _host_semaphores:
+            _host_semaphores[key] = threading.BoundedSemaphore(max_per_host)
+        return _host_semaphores[key]
+
+
+# 并发执行抓取任务：
+#   urls          - 需要抓取的 URL 列表
+#   fetch_func    - 对单个 URL 执行抓取的函数，例如 extract_prices
+#   on_progress   - 每完成一个任务调用一次 on_progress(done, total)，在调用线程中执行（可安全更新 Streamlit 进度条）
+#   on_result     - 每完成一个任务调用一次 on_result(index, result)，在调用线程中执行（例如写入断点记录）
+#   error_result  - 某个任务抛出异常时使用的结果；为 None 时直接抛出异常
+# 返回值与 urls 顺序一一对应
+def fetch_concurrently(urls, fetch_func, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                       on_progress=None, on_result=None, error_result=None):
+    total = len(urls)
+    results = [None] * total
+    if total == 0:
+        return results
+
+    def run(url):
+        with get_host_semaphore(url, max_per_host):
+            return fetch_func(url)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, total)) as executor:
+        futures = {executor.submit(run, url): idx for idx, url in enumerate(urls)}
+        done = 0
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+            except Exception:
+                if error_result is None:
+                    raise
+                results[idx] = error_result
+            if on_result:
+                on_result(idx, results[idx])
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+
+    return results
+
+
+# 有序流式版本：urls 可以是生成器，最多同时保留 window 个未输出的任务，
+# 按输入顺序逐个 yield 结果，内存占用与任务总数无关
+def iter_fetch_concurrently(urls, fetch_func, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                            window=None, error_result=None):
+    window = window or max_workers * 4
+
+    def run(url):
+        with get_host_semaphore(url, max_per_host):
+            return fetch_func(url)
+
+    def result_of(future):
+        try:
+            return future.result()
+        except Exception:
+            if error_result is None:
+                raise
+            return error_result
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for url in urls:
+            pending.append(executor.submit(run, url))
+            if len(pending) >= window:
+                yield result_of(pending.popleft())
+        while pending:
+            yield result_of(pending.popleft())
+    finally:
+        # 调用方提前停止（例如页面刷新）时，取消尚未开始的任务
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 带总时限的并发抓取：按完成顺序 yield (输入序号, 结果)，超过 timeout 秒后不再等待，
+# 未完成的任务留在后台线程中继续运行（结果丢弃），调用方据此把它们标记为超时
+def iter_fetch_as_completed(urls, fetch_func, timeout, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                            error_result=None):
+    urls = list(urls)
+    if not urls:
+        return
+
+    def run(url):
+        with get_host_semaphore(url, max_per_host):
+            return fetch_func(url)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+    futures = {executor.submit(run, url): idx for idx, url in enumerate(urls)}
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            try:
+                result = future.result()
+            except Exception:
+                if error_result is None:
+                    raise
+                result = error_result
+            yield futures[future], result
+    except FuturesTimeoutError:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 下载失败的页面在两段之间传递时使用的标记
+_FETCH_FAILED = object()
+
+
+# 两段式流水线：I/O 线程下载页面（fetch_func 返回 HTML 文本），进程池解析（parse_func 必须是模块级函数，
+# 返回值要能在进程间传递），解析不再受 GIL 限制。
+# 两段之间最多保留 queue_size 个等待解析的页面，解析跟不上时下载也会暂停（背压）。
+# 按输入顺序逐个 yield 解析结果；error_result 同时用于下载失败和解析失败
+def iter_fetch_and_parse(urls, fetch_func, parse_func, parse_workers=None, max_workers=MAX_WORKERS,
+                         max_per_host=MAX_PER_HOST, queue_size=None, error_result=None):
+    parse_workers = parse_workers or PARSE_WORKERS
+    queue_size = queue_size or parse_workers * 4
+    pages = iter_fetch_concurrently(urls, fetch_func, max_workers, max_per_host,
+                                    error_result=None if error_result is None else _FETCH_FAILED)
+
+    def result_of(item):
+        if item is _FETCH_FAILED:
+            return error_result
+        try:
+            return item.result()
+        except Exception:
+            if error_result is None:
+                raise
+            return error_result
+
+    start_method = PARSE_START_METHOD if PARSE_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+    executor = ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context(start_method))
+    pending = deque()
+    try:
+        for html in pages:
+            pending.append(html if html is _FETCH_FAILED else executor.submit(parse_func, html))
+            if len(pending) >= queue_size:
+                yield result_of(pending.popleft())
+        while pending:
+            yield result_of(pending.popleft())
+    finally:
+        pages.close()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,266 @@
+import os
+import json
+import gzip
+import hashlib
+import time
+import threading
+from datetime import datetime
+
+# 原始页面存档：每次运行抓到的商品页 / 列表页 HTML 按内容去重、压缩后保存，
+# 解析规则失效（例如 Elkjop 改了价格元素的 class）时，修好选择器后可以直接从存档重新解析，不再请求网站
+#
+# 目录结构（ARCHIVE_DIR 下）：
+#   segments/<时间>-<进程号>.gz  - 页面内容，每个不同的页面是一个独立的 gzip 成员，顺序追加
+#   blobs.jsonl                  - 内容哈希 -> (段文件, 偏移, 长度)，每个不同的页面一行
+#   index/<YYYY-MM-DD>.jsonl     - 当天每个 URL 抓到的内容哈希，同一 URL 以最后一行为准
+# 内容相同的页面（同一商品多次抓取、价格未变）只保存一份
+# 超过保留天数的日期索引会被删除；总大小超过上限时从最早的日期开始删除，并删除不再被任何日期引用的段文件
+# （其他进程可能正在写入的段文件不删除）
+
+ARCHIVE_DIR = os.environ.get("HTML_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".archive"))
+
+# 默认关闭，设置环境变量 HTML_ARCHIVE=1 开启存档
+ARCHIVE_ENABLED = os.environ.get("HTML_ARCHIVE", "0") == "1"
+
+# 存档总大小上限（字节）和保留天数
+MAX_ARCHIVE_BYTES = 500 * 1024 * 1024
+MAX_ARCHIVE_AGE_DAYS = 30
+
+# 每写入多少个新页面检查一次存档大小（避免每次写入都扫描目录）
+PRUNE_CHECK_INTERVAL = 200
+
+# 最近这么多秒内修改过的段文件可能属于正在运行的其他进程（索引行可能还没写完），清理时不删除
+SEGMENT_GRACE_SECONDS = 6 * 3600
+
+# 单个段文件的大小上限（字节），超出后新建段文件
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+COMPRESS_LEVEL = 6
+
+_lock = threading.Lock()
+_blobs = None  # 内容哈希 -> [段文件名, 偏移, 长度]
+_day_urls = {}  # 日期 -> {URL: 内容哈希}（本进程已写入的索引，避免重复写同样的行）
+_segment = None  # 当前段文件 [文件名, 文件对象]
+_writes_since_prune = 0
+
+
+def _blob_index_path():
+    return os.path.join(ARCHIVE_DIR, "blobs.jsonl")
+
+
+def _day_index_path(day):
+    return os.path.join(ARCHIVE_DIR, "index", f"{day}.jsonl")
+
+
+# 读取 JSON-lines 文件，跳过写了一半的行
+def _read_lines(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except OSError:
+        return
+
+
+def _append_line(path, record):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# 首次使用时加载内容哈希索引（调用方已持有 _lock）
+def _load_blobs():
+    global _blobs
+    if _blobs is None:
+        _blobs = {}
+        for record in _read_lines(_blob_index_path()):
+            _blobs[record["sha"]] = [record["segment"], record["offset"], record["length"]]
+    return _blobs
+
+
+# 当前进程的段文件，超出大小上限时换新文件（调用方已持有 _lock）
+# 每个进程写自己的段文件，命令行批量运行和 Streamlit 同时存档时不会互相覆盖
+def _segment_file():
+    global _segment
+    if _segment is not None and _segment[1].tell() >= SEGMENT_MAX_BYTES:
+        _segment[1].close()
+        _segment = None
+    if _segment is None:
+        os.makedirs(os.path.join(ARCHIVE_DIR, "segments"), exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}.gz"
+        _segment = [name, open(os.path.join(ARCHIVE_DIR, "segments", name), "ab")]
+    return _segment
+
+
+# 保存一个页面：url 为任务使用的 URL（重新解析时按它查找），html 为页面文本或字节
+# （流式读取提前停止时为已读取的部分，重新解析只需要这一部分）
+def archive_page(url, html):
+    global _writes_since_prune
+    if not ARCHIVE_ENABLED or not html:
+        return
+    data = html if isinstance(html, bytes) else html.encode("utf-8")
+    sha = hashlib.sha256(data).hexdigest()
+    day = datetime.now().strftime("%Y-%m-%d")
+    try:
+        with _lock:
+            blobs = _load_blobs()
+            if sha not in blobs:
+                name, f = _segment_file()
+                offset = f.tell()
+                f.write(gzip.compress(data, COMPRESS_LEVEL))
+                f.flush()
+                blobs[sha] = [name, offset, f.tell() - offset]
+                _append_line(_blob_index_path(), {"sha": sha, "segment": name, "offset": offset,
+                                                  "length": blobs[sha][2], "size": len(data)})
+                _writes_since_prune += 1
+
+            urls = _day_urls.setdefault(day, {})
+            if urls.get(url) != sha:
+                urls[url] = sha
+                _append_line(_day_index_path(day), {"url": url, "sha": sha,
+                                                    "ts": datetime.now().isoformat(timespec="seconds")})
+    except OSError:
+        pass  # 存档写不进去时不影响抓取
+
+    if _writes_since_prune >= PRUNE_CHECK_INTERVAL:
+        _writes_since_prune = 0
+        prune_archive()
+
+
+# 段文件 -> (大小, 修改时间)
+def _segment_files():
+    files = {}
+    segment_dir = os.path.join(ARCHIVE_DIR, "segments")
+    try:
+        names = os.listdir(segment_dir)
+    except OSError:
+        return files
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(segment_dir, name))
+        except OSError:
+            continue
+        files[name] = (stat.st_size, stat.st_mtime)
+    return files
+
+
+# 删除过期的日期索引；总大小超过上限时从最早的日期开始删除，然后删除不再被任何日期引用的段文件并重写内容哈希索引
+# 段文件是删除的最小单位：只要还有一个页面被引用，整个段文件就保留；
+# 当前进程正在写的和最近修改过的段文件（可能属于其他进程）也保留
+def prune_archive(max_bytes=None, max_age_days=None):
+    global _blobs
+    max_bytes = MAX_ARCHIVE_BYTES if max_bytes is None else max_bytes
+    max_age_days = MAX_ARCHIVE_AGE_DAYS if max_age_days is None else max_age_days
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    with _lock:
+        days = sorted(list_days())
+        for day in list(days):
+            if day != today and (datetime.now() - datetime.strptime(day, "%Y-%m-%d")).days > max_age_days:
+                _remove(_day_index_path(day))
+                days.remove(day)
+
+        files = _segment_files()
+        if sum(size for size, _ in files.values()) <= max_bytes:
+            return
+
+        # 重新读取内容哈希索引，包括其他进程写入的页面
+        _blobs = None
+        blobs = _load_blobs()
+        protected = {name for name, (_, mtime) in files.items() if time.time() - mtime < SEGMENT_GRACE_SECONDS}
+        if _segment is not None:
+            protected.add(_segment[0])
+        day_shas = {day: set(load_day(day).values()) for day in days}
+        while True:
+            keep = {blobs[sha][0] for day in days for sha in day_shas[day] if sha in blobs} | protected
+            if sum(size for name, (size, _) in files.items() if name in keep) <= max_bytes or len(days) <= 1:
+                break
+            _remove(_day_index_path(days.pop(0)))
+
+        deleted = {name for name in files if name not in keep}
+        for name in deleted:
+            _remove(os.path.join(ARCHIVE_DIR, "segments", name))
+        if deleted:
+            path = _blob_index_path()
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                for record in _read_lines(path):
+                    if record["segment"] not in deleted:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(path + ".tmp", path)
+            _blobs = None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# 有存档的日期（最新的在前）
+def list_days():
+    try:
+        names = os.listdir(os.path.join(ARCHIVE_DIR, "index"))
+    except OSError:
+        return []
+    return sorted((name[:-len(".jsonl")] for name in names if name.endswith(".jsonl")), reverse=True)
+
+
+# 某一天存档的 {URL: 内容哈希}，同一 URL 取当天最后一次抓取
+def load_day(day):
+    return {record["url"]: record["sha"] for record in _read_lines(_day_index_path(day))}
+
+
+def read_blob(sha):
+    global _blobs
+    with _lock:
+        location = _load_blobs().get(sha)
+        if location is None:
+            # 其他进程写入的新页面：重新读取索引
+            _blobs = None
+            location = _load_blobs().get(sha)
+    if location is None:
+        raise KeyError(sha)
+    name, offset, length = location
+    with open(os.path.join(ARCHIVE_DIR, "segments", name), "rb") as f:
+        f.seek(offset)
+        return gzip.decompress(f.read(length)).decode("utf-8")
+
+
+class PageNotArchived(LookupError):
+    pass
+
+
+# 存档中某一天的页面读取器：reader(url) 返回页面 HTML，没有存档时抛出 PageNotArchived
+# 参数与 retailers.fetch_*_html 兼容（忽略 use_cache 等参数），可直接替换下载函数
+class ArchiveReader:
+    def __init__(self, day):
+        self.day = day
+        self.urls = load_day(day)
+
+    def __call__(self, url, *args, **kwargs):
+        return read_blob(self.sha(url))
+
+    # 页面的内容哈希（内容相同的页面只需解析一次）
+    def sha(self, url):
+        sha = self.urls.get(url)
+        if sha is None:
+            raise PageNotArchived(f"{url} is not archived for {self.day}")
+        return sha
+
+    def __len__(self):
+        return len(self.urls)
+
+
+# 存档统计：页面数（去重后）、压缩后大小、原始大小
+def get_stats():
+    records = list(_read_lines(_blob_index_path()))
+    return {
+        "pages": len(records),
+        "compressed_bytes": sum(record["length"] for record in records),
+        "raw_bytes": sum(record.get("size", 0) for record in records),
+        "days": len(list_days()),
+    }
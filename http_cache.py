@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# 本地磁盘 HTTP 缓存：按 URL 存储商品页面，过期后用 ETag / Last-Modified 条件请求重新验证，
+# 总大小超过上限时按最近访问时间（LRU）淘汰
+
+CACHE_DIR = os.environ.get("PRICE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "http"))
+
+# 缓存总大小上限（字节）
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+# 按零售商配置缓存有效期（秒），按域名关键字匹配
+CACHE_TTL = {
+    "elgiganten": 6 * 3600,
+    "elkjop": 6 * 3600,
+    "gigantti": 6 * 3600,
+    "komplett": 6 * 3600,
+    "kjell": 6 * 3600,
+}
+DEFAULT_TTL = 3600
+
+# 每写入多少个条目检查一次缓存大小（避免每次写入都扫描整个目录）
+EVICT_CHECK_INTERVAL = 50
+
+_lock = threading.Lock()
+_writes_since_evict = 0
+
+
+# 获取某个 URL 对应的缓存有效期
+def get_ttl(url):
+    host = urlparse(url).netloc
+    for keyword, ttl in CACHE_TTL.items():
+        if keyword in host:
+            return ttl
+    return DEFAULT_TTL
+
+
+def _cache_paths(url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, key + ".body"), os.path.join(CACHE_DIR, key + ".json")
+
+
+# 读取缓存条目，返回 (meta, body)；不存在或损坏时返回 (None, None)
+def _read_entry(url):
+    body_path, meta_path = _cache_paths(url)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+    except (OSError, ValueError):
+        return None, None
+    return meta, body
+
+
+# 写入缓存条目（先写临时文件再替换，避免并发读到半个文件）
+def _write_entry(url, meta, body=None):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    body_path, meta_path = _cache_paths(url)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    if body is not None:
+        with open(body_path + suffix, "wb") as f:
+            f.write(body)
+        os.replace(body_path + suffix, body_path)
+    with open(meta_path + suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + suffix, meta_path)
+
+
+# 更新访问时间，用于 LRU 淘汰
+def _touch(url):
+    body_path, _ = _cache_paths(url)
+    try:
+        os.utime(body_path, None)
+    except OSError:
+        pass
+
+
+# 缓存总大小超过上限时，删除最久未访问的条目
+def evict_if_needed(max_bytes=None):
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        try:
+            names = os.listdir(CACHE_DIR)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(".body"):
+                continue
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            for p in (path, path[:-len(".body")] + ".json"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            total -= size
+            if total <= max_bytes:
+                break
+
+
+def _maybe_evict():
+    global _writes_since_evict
+    with _lock:
+        _writes_since_evict += 1
+        if _writes_since_evict < EVICT_CHECK_INTERVAL:
+            return
+        _writes_since_evict = 0
+    evict_if_needed()
+
+
+# 清空缓存
+def clear_cache():
+    with _lock:
+        try:
+            names = os.listdir(CACHE_DIR)
+        except OSError:
+            return
+        for name in names:
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+# 用缓存内容构造一个 requests.Response，调用方可像普通响应一样使用 .text / .raise_for_status()
+def _build_response(url, meta, body):
+    response = requests.Response()
+    response.status_code = meta.get("status_code", 200)
+    response._content = body
+    response.encoding = meta.get("encoding")
+    response.headers = CaseInsensitiveDict(meta.get("headers", {}))
+    response.url = meta.get("final_url", url)
+    response.from_cache = True
+    return response
+
+
+# 返回未过期的缓存响应，没有时返回 None
+def get_fresh(url):
+    meta, body = _read_entry(url)
+    if meta is None or time.time() - meta.get("fetched_at", 0) >= get_ttl(url):
+        return None
+    _touch(url)
+    return _build_response(url, meta, body)
+
+
+# 保存一个成功的响应；body 为完整的响应内容
+def store_response(url, response, body, fetched_at=None):
+    meta = {
+        "url": url,
+        "final_url": response.url,
+        "status_code": response.status_code,
+        "encoding": response.encoding,
+        "headers": {k: v for k, v in response.headers.items() if k.lower() == "content-type"},
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched_at": time.time() if fetched_at is None else fetched_at,
+    }
+    _write_entry(url, meta, body)
+    _maybe_evict()
+
+
+# 带缓存的 GET 请求：
+#   - 缓存未过期：直接返回缓存内容
+#   - 缓存已过期：带 If-None-Match / If-Modified-Since 重新验证，304 时沿用缓存
+#   - bypass=True：跳过缓存直接请求（仍会写入新结果）
+# send 为实际发送请求的函数，参数与 requests.Session.get 相同
+def cached_get(send, url, headers=None, timeout=20, allow_redirects=True, bypass=False):
+    meta, body = (None, None) if bypass else _read_entry(url)
+    now = time.time()
+
+    if meta is not None and now - meta.get("fetched_at", 0) < get_ttl(url):
+        _touch(url)
+        return _build_response(url, meta, body)
+
+    request_headers = dict(headers or {})
+    if meta is not None:
+        if meta.get("etag"):
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = send(url, headers=request_headers, timeout=timeout, allow_redirects=allow_redirects)
+
+    if response.status_code == 304 and meta is not None:
+        meta["fetched_at"] = now
+        _write_entry(url, meta)
+        _touch(url)
+        return _build_response(url, meta, body)
+
+    # 只缓存成功的响应
+    if response.status_code == 200:
+        store_response(url, response, response.content, now)
+
+    response.from_cache = False
+    return response
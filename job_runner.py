@@ -0,0 +1,178 @@
+import os
+import json
+import uuid
+import shutil
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# 后台任务：整表抓取放到进程内的线程池中运行，不占用 Streamlit 脚本线程，
+# 关闭页面后任务继续运行；任务有编号、进度、可取消，结果文件保存在 JOB_DIR 中，之后回到页面即可下载
+# 任务信息同时写入 JOB_DIR/<编号>/job.json，服务重启后仍能看到已完成任务的结果
+
+JOB_DIR = os.environ.get("JOB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jobs"))
+
+# 同时运行的任务数上限，超出的任务排队等待
+MAX_CONCURRENT_JOBS = 2
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, INTERRUPTED = "queued", "running", "done", "failed", "cancelled", "interrupted"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="job")
+_jobs = {}
+_lock = threading.Lock()
+
+
+class Job:
+    def __init__(self, kind, label, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.label = label
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.error = None
+        self.outputs = []  # [{"label", "path", "file_name", "mime"}]
+        self.created_at = datetime.now().isoformat(timespec="seconds")
+        self.finished_at = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def dir(self):
+        return os.path.join(JOB_DIR, self.id)
+
+    # 任务函数中定期调用，更新进度（done / total）
+    def update(self, done, total=None, message=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+
+    # 任务函数应定期检查，为 True 时尽快停止
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    # 结果文件路径（位于任务目录中）
+    def output_path(self, file_name):
+        os.makedirs(self.dir, exist_ok=True)
+        return os.path.join(self.dir, file_name)
+
+    def add_output(self, label, path, file_name=None, mime="text/plain"):
+        self.outputs.append({"label": label, "path": path, "file_name": file_name or os.path.basename(path),
+                             "mime": mime})
+        self._save()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "message": self.message,
+            "error": self.error,
+            "outputs": self.outputs,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _save(self):
+        try:
+            path = self.output_path("job.json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+    @classmethod
+    def _from_dict(cls, data):
+        job = cls(data["kind"], data["label"], data["id"])
+        for name in ("status", "done", "total", "message", "error", "outputs", "created_at", "finished_at"):
+            setattr(job, name, data.get(name, getattr(job, name)))
+        # 上一次进程退出时仍在运行的任务无法继续
+        if job.status in ACTIVE_STATES:
+            job.status = INTERRUPTED
+        return job
+
+
+def _run(job, func, args, kwargs):
+    if job.is_cancelled():
+        return
+    job.status = RUNNING
+    job._save()
+    try:
+        func(job, *args, **kwargs)
+        job.status = CANCELLED if job.is_cancelled() else DONE
+    except Exception as e:
+        job.status = FAILED
+        job.error = str(e)
+    job.finished_at = datetime.now().isoformat(timespec="seconds")
+    job._save()
+
+
+# 提交任务，返回任务编号；func(job, *args, **kwargs) 在后台线程中运行
+def submit(kind, label, func, *args, **kwargs):
+    job = Job(kind, label)
+    with _lock:
+        _jobs[job.id] = job
+    job._save()
+    job.future = _executor.submit(_run, job, func, args, kwargs)
+    return job.id
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+# 取消任务：排队中的任务直接取消，运行中的任务在下一次检查时停止
+def cancel(job_id):
+    job = get_job(job_id)
+    if job is None or job.status not in ACTIVE_STATES:
+        return False
+    job._cancel.set()
+    if job.future is not None and job.future.cancel():
+        job.status = CANCELLED
+        job.finished_at = datetime.now().isoformat(timespec="seconds")
+        job._save()
+    return True
+
+
+# 删除已结束的任务及其结果文件
+def remove(job_id):
+    job = get_job(job_id)
+    if job is None or job.status in ACTIVE_STATES:
+        return False
+    with _lock:
+        _jobs.pop(job_id, None)
+    shutil.rmtree(job.dir, ignore_errors=True)
+    return True
+
+
+# 列出任务（最新的在前），kind 不为空时只列出该类型
+def list_jobs(kind=None):
+    with _lock:
+        jobs = list(_jobs.values())
+    return sorted((job for job in jobs if kind is None or job.kind == kind),
+                  key=lambda job: job.created_at, reverse=True)
+
+
+# 启动时读取之前保存的任务信息
+def _load_saved_jobs():
+    if not os.path.isdir(JOB_DIR):
+        return
+    for job_id in os.listdir(JOB_DIR):
+        try:
+            with open(os.path.join(JOB_DIR, job_id, "job.json"), "r", encoding="utf-8") as f:
+                job = Job._from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            continue
+        _jobs[job.id] = job
+
+
+_load_saved_jobs()
@@ -0,0 +1,74 @@
+import os
+from functools import partial
+
+import streamlit as st
+
+import job_runner
+
+# 各 Streamlit 页面共用的后台任务列表：状态、进度、取消 / 删除按钮和结果下载
+# 有排队或运行中的任务时，列表每隔 POLL_SECONDS 秒自动刷新（只重新运行这一部分，不重新运行整个页面），
+# 没有时不刷新；结果文件在点击下载时才读取
+
+POLL_SECONDS = 2
+
+# 后台任务总是抓取全部产品，页面上的“继续上一次运行”和“自适应刷新”选项不适用，选中时显示此说明并禁用后台运行
+BACKGROUND_UNSUPPORTED = ("Background jobs always fetch every product. "
+                          "Untick 'Resume last run' and 'Adaptive refresh' to run in the background.")
+
+STATUS_ICONS = {
+    job_runner.QUEUED: "⏳",
+    job_runner.RUNNING: "🔄",
+    job_runner.DONE: "✅",
+    job_runner.FAILED: "❌",
+    job_runner.CANCELLED: "⛔",
+    job_runner.INTERRUPTED: "⚠️",
+}
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _render_job(job):
+    st.write(f"{STATUS_ICONS.get(job.status, '')} **{job.label}** · `{job.id}` · {job.status} · started {job.created_at}")
+    if job.status in job_runner.ACTIVE_STATES:
+        st.progress(job.done / job.total if job.total else 0.0, text=f"{job.done}/{job.total} {job.message}")
+        if st.button("Cancel", key=f"cancel_{job.id}"):
+            job_runner.cancel(job.id)
+    else:
+        if job.error:
+            st.error(job.error)
+        for output in job.outputs:
+            if os.path.exists(output["path"]):
+                st.download_button(f"📥 {output['label']}", partial(_read_file, output["path"]),
+                                   file_name=output["file_name"], mime=output["mime"],
+                                   key=f"download_{job.id}_{output['file_name']}")
+        if st.button("Remove", key=f"remove_{job.id}"):
+            job_runner.remove(job.id)
+            st.rerun()
+
+
+# 是否有排队或运行中的任务
+def _has_active_jobs(kind):
+    return any(job.status in job_runner.ACTIVE_STATES for job in job_runner.list_jobs(kind))
+
+
+# 显示 kind 类型的后台任务
+# 是否自动刷新在每次运行整个页面时决定；任务全部结束后重新运行一次页面，停止刷新
+def render_jobs_panel(kind):
+    polling = _has_active_jobs(kind)
+
+    @st.fragment(run_every=POLL_SECONDS if polling else None)
+    def jobs_fragment():
+        jobs = job_runner.list_jobs(kind)
+        if not jobs:
+            st.write("No background jobs yet.")
+        for job in jobs:
+            with st.container(border=True):
+                _render_job(job)
+        if polling and not any(job.status in job_runner.ACTIVE_STATES for job in jobs):
+            st.rerun()
+
+    st.subheader("Background jobs")
+    jobs_fragment()
@@ -1,66 +1,51 @@
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 from datetime import datetime
 from io import BytesIO
+from catalog_runs import KJELL_STOCK_COLUMNS, crawl_kjell_stock
+from metrics_panel import render_metrics_sidebar
 
-URL = "https://www.kjell.com/se/varumarken/tp-link?count=240&sortBy=popularity"
-HEADERS = {"User-Agent": "Mozilla/5.0"}
+# 默认抓取的品牌（Kjell 品牌页地址中的名称，例如 https://www.kjell.com/se/varumarken/tp-link）
+DEFAULT_BRANDS = ["tp-link"]
 
-def parse_page(url):
-    res = requests.get(url, headers=HEADERS)
-    soup = BeautifulSoup(res.text, 'html.parser')
-
-    product_cards = soup.find_all("a", class_="product-card__link")
-    records = []
-
-    for card in product_cards:
-        name = card.find("div", class_="product-card__title")
-        if not name:
-            continue
-        name = name.text.strip()
-        product_url = "https://www.kjell.com" + card['href']
-
-        availability = card.find("div", class_="product-card__availability")
-        if availability:
-            availability_text = availability.get_text(separator="\n", strip=True)
-            online = next((line for line in availability_text.split("\n") if "Online" in line), "Online: N/A")
-            butik = next((line for line in availability_text.split("\n") if "butiker" in line), "Finns i 0 butiker")
-
-            # 提取数字
-            online_qty = online.replace("Online", "").strip()
-            butik_qty = ''.join(filter(str.isdigit, butik))
-        else:
-            online_qty = "N/A"
-            butik_qty = "0"
-
-        records.append({
-            "Datum": datetime.now().strftime("%Y-%m-%d"),
-            "Produktnamn": name,
-            "Produktlänk": product_url,
-            "Online": online_qty,
-            "Butik": butik_qty
-        })
-
-    return pd.DataFrame(records)
+# 抓取多个品牌的所有列表页（自动分页、并发、按链接去重），逻辑在 catalog_runs.py 中
+# 返回 (DataFrame, 抓取失败的页面 [(品牌, 页码)])
+def parse_brands(brands):
+    records, failed_pages = crawl_kjell_stock(brands)
+    return pd.DataFrame(records, columns=KJELL_STOCK_COLUMNS), failed_pages
 
+# openpyxl 只写模式逐行写入，不在内存中保留整张工作表的单元格对象
 def to_excel(df):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Lagerstatus")
+    sheet.append(list(df.columns))
+    for row in df.itertuples(index=False):
+        sheet.append(list(row))
     output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="TP-Link Lagerstatus")
+    workbook.save(output)
     output.seek(0)
     return output
 
 # ---------------- Streamlit UI ----------------
 
 st.set_page_config(page_title="Kjell Lagerstatus", layout="wide")
-st.title("📦 TP-Link Produkter – Lagerstatus från Kjell.com")
+st.title("📦 Produkter – Lagerstatus från Kjell.com")
+
+# 品牌列表（逗号分隔）
+brands_input = st.text_input("Varumärken (kommaseparerade)", ", ".join(DEFAULT_BRANDS))
+brands = [brand.strip().lower() for brand in brands_input.split(",") if brand.strip()]
 
-if st.button("🚀 開始抓取"):
+if brands and st.button("🚀 開始抓取"):
     with st.spinner("抓取中，請稍候..."):
-        df = parse_page(URL)
-        st.success(f"抓取成功，共獲取 {len(df)} 款產品。")
+        df, failed_pages = parse_brands(brands)
+        if failed_pages:
+            # 有列表页抓取失败：结果不是完整的库存快照
+            st.warning(f"有 {len(failed_pages)} 個列表頁抓取失敗，結果不完整："
+                       + ", ".join(f"{brand} p.{page}" for brand, page in failed_pages))
+        else:
+            st.success(f"抓取成功，共獲取 {len(df)} 款產品。")
         st.dataframe(df, use_container_width=True)
 
         # 导出 Excel 文件
@@ -70,6 +55,9 @@ if st.button("🚀 開始抓取"):
         st.download_button(
             label="📥 點擊下載 Excel 檔",
             data=excel_data,
-            file_name=f"tp_link_lagerstatus_{datetime.now().strftime('%Y%m%d')}.xlsx",
+            file_name=f"{'_'.join(brands).replace('-', '_')}_lagerstatus_{datetime.now().strftime('%Y%m%d')}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+
+# 侧边栏：共享请求缓存命中统计和请求耗时
+render_metrics_sidebar()
@@ -0,0 +1,117 @@
+import io
+import os
+import re
+import time
+import threading
+
+# 产品对照表（product_mapping.csv / Elkjop.csv / KPL.csv）的进程级缓存：
+# Streamlit 每次交互都会重新执行脚本，这里只在缓存过期后用 ETag / Last-Modified 向 GitHub 条件请求，
+# 网络不可用时退回到仓库中自带的同名 CSV 文件
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 仓库中对照表文件的 GitHub 原始地址前缀
+GITHUB_RAW_URL = "https://raw.githubusercontent.com/DaryWang/product-lookup-app/refs/heads/main/"
+
+# 缓存多长时间后向 GitHub 重新验证（秒）
+REVALIDATE_SECONDS = 300
+
+_cache = {}
+_lock = threading.Lock()
+
+
+# 读取 CSV 内容（兼容带 BOM 的 UTF-8 文件）
+def _read_csv(data):
+    import pandas as pd
+    return pd.read_csv(io.BytesIO(data), encoding="utf-8-sig")
+
+
+# 仓库中自带的同名 CSV 文件路径
+def local_csv_path(url):
+    return os.path.join(BASE_DIR, os.path.basename(url))
+
+
+def _load_local(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return _read_csv(f.read())
+
+
+# 加载对照表，返回 DataFrame；GitHub 和本地文件都不可用时返回 None
+# 返回的 DataFrame 在进程内共享，调用方不要原地修改
+def load_mapping_csv(url, local_path=None, timeout=10):
+    from retailers import get_session
+
+    if local_path is None:
+        local_path = local_csv_path(url)
+
+    now = time.time()
+    with _lock:
+        entry = _cache.get(url)
+    if entry is not None and now - entry["checked_at"] < REVALIDATE_SECONDS:
+        return entry["df"]
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = get_session(url).get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            entry["checked_at"] = now
+            return entry["df"]
+        response.raise_for_status()
+        entry = {
+            "df": _read_csv(response.content),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "checked_at": now,
+        }
+    except Exception:
+        # 网络失败：优先沿用已缓存的版本，否则使用本地 CSV
+        if entry is not None:
+            entry["checked_at"] = now
+            return entry["df"]
+        df = _load_local(local_path)
+        if df is None:
+            return None
+        entry = {"df": df, "etag": None, "last_modified": None, "checked_at": now}
+
+    with _lock:
+        _cache[url] = entry
+    return entry["df"]
+
+
+# 把粘贴的文本拆分为多个条目（按换行、逗号或分号分隔）
+def split_entries(text):
+    return [entry.strip() for entry in re.split(r"[\n,;]+", text or "") if entry.strip()]
+
+
+# 将产品编号或产品名称解析为 (Product ID, Product Name) 列表，按输入顺序去重
+#   - 与对照表中的编号或名称匹配的条目使用对照表中的编号和名称
+#     （名称比较忽略大小写、空格和标点，与搜索框一致，例如 "Archer AX-10" 匹配 "Archer AX10"）
+#   - 不在对照表中但看起来像编号的条目（不含空格）原样作为编号查询
+#   index - 对照表的 search_index.SearchIndex（见 search_panel.load_mapping_index），为 None 时不做匹配
+# 返回 (产品列表, 无法识别的条目列表)
+def resolve_products(entries, index=None):
+    products = []
+    unknown = []
+    seen = set()
+    for entry in entries:
+        entry = str(entry).strip()
+        product_id = None
+        if index is not None:
+            product_id = entry if index.lookup_name(entry) is not None else index.lookup_id(entry)
+        if product_id is None:
+            if not entry or " " in entry:
+                unknown.append(entry)
+                continue
+            product_id = entry
+        if product_id not in seen:
+            seen.add(product_id)
+            products.append((product_id, (index.lookup_name(product_id) if index is not None else None) or ""))
+    return products, unknown
@@ -0,0 +1,25 @@
+import pandas as pd
+import streamlit as st
+
+from request_coalescing import get_stats as get_request_stats
+from request_metrics import TRACE_ENABLED, TRACE_FILE, host_summary, parse_summary
+
+# 各 Streamlit 页面共用的侧边栏：共享请求缓存命中统计，以及按域名 / 解析函数汇总的耗时
+# 统计数据在同一进程的所有会话间共享
+
+
+def render_metrics_sidebar():
+    request_stats = get_request_stats()
+    st.sidebar.subheader("Shared request cache")
+    st.sidebar.write(f"Hits: {request_stats['hits']} | Coalesced: {request_stats['coalesced']} | "
+                     f"Misses: {request_stats['misses']}")
+
+    with st.sidebar.expander("Request metrics"):
+        hosts = host_summary()
+        if hosts:
+            st.dataframe(pd.DataFrame(hosts), use_container_width=True, hide_index=True)
+            st.dataframe(pd.DataFrame(parse_summary()), use_container_width=True, hide_index=True)
+        else:
+            st.write("No requests yet.")
+        if TRACE_ENABLED:
+            st.caption(f"Trace file: {TRACE_FILE}")
@@ -0,0 +1,114 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+# 结果表的后处理（按列向量化，适用于整张历史表）：
+#   - 把 "1.299,-"、"1 299,00 €"、"299.-"、"N/A" 之类的价格文本转换为数值
+#   - 按汇率表换算为同一币种，计算折扣百分比和同一产品在各国之间的价差
+
+# 各国家网站使用的币种
+COUNTRY_CURRENCY = {
+    "Sweden": "SEK",
+    "Norway": "NOK",
+    "Finland": "EUR",
+    "Denmark": "DKK",
+}
+
+# 换算的目标币种，以及 1 单位各币种折合多少目标币种
+# 可以用环境变量 FX_RATES_FILE 指向一个 JSON 文件覆盖，例如 {"NOK": 0.97, "EUR": 11.4}
+BASE_CURRENCY = "SEK"
+FX_RATES = {
+    "SEK": 1.0,
+    "NOK": 0.98,
+    "EUR": 11.5,
+    "DKK": 1.54,
+}
+
+
+def load_fx_rates(path=None):
+    rates = dict(FX_RATES)
+    path = path or os.environ.get("FX_RATES_FILE")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            rates.update(json.load(f))
+    return rates
+
+
+# 把价格文本列转换为浮点数列，无法识别的值（N/A、ERROR、"Request failed: ..."、空值）为 NaN
+# 小数点判断：末尾是 ",xx" 时逗号为小数点，末尾是 ".xx" 时点为小数点，其余的逗号、点、空格都视为千位分隔符
+def parse_price_series(series):
+    text = series.astype("string")
+    text = text.mask(text.str.contains(r"error|failed", case=False, regex=True).fillna(False))
+    text = text.str.replace(r"[^\d,.\-]", "", regex=True)
+    text = text.str.replace(r"[.,]?-+$", "", regex=True).str.replace("-", "", regex=False)
+
+    decimal_comma = text.str.contains(r",\d{1,2}$", regex=True).fillna(False)
+    decimal_dot = text.str.contains(r"\.\d{1,2}$", regex=True).fillna(False)
+
+    digits_only = text.str.replace(r"[.,]", "", regex=True)
+    comma_decimal = text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    dot_decimal = text.str.replace(",", "", regex=False)
+
+    normalized = digits_only.where(~decimal_comma, comma_decimal).where(~decimal_dot, dot_decimal)
+    return pd.to_numeric(normalized.replace("", pd.NA), errors="coerce").astype("float64")
+
+
+# 为结果表（PRICE_COLUMNS 或价格历史表）增加数值列：
+#   Regular / Promo      - 数值价格（原币种）
+#   Currency             - 按国家推断的币种
+#   Price                - 实际售价（有促销价时为促销价，否则为常规价）
+#   Discount %           - 促销相对常规价的折扣
+#   Price (BASE_CURRENCY) - 按汇率换算后的实际售价
+def add_numeric_prices(df, fx_rates=None):
+    fx_rates = fx_rates or load_fx_rates()
+    result = df.copy()
+    regular = parse_price_series(result["Regular Price"])
+    promo = parse_price_series(result["Promo Price"])
+
+    result["Regular"] = regular
+    result["Promo"] = promo
+    result["Currency"] = result["Country"].map(COUNTRY_CURRENCY)
+    result["Price"] = promo.fillna(regular)
+    result["Discount %"] = ((regular - promo) / regular * 100).where(promo.notna() & (regular > 0)).round(1)
+    result[f"Price ({BASE_CURRENCY})"] = (result["Price"] * result["Currency"].map(fx_rates)).round(2)
+    return result
+
+
+# 价格比较表中各国价格列之后的统计列
+SPREAD_COLUMNS = ["Min", "Max", "Cheapest", "Most Expensive", "Spread", "Spread %"]
+
+
+# 同一产品在各国之间的价格比较（每个产品一行，各国一列，单位为 BASE_CURRENCY）：
+# 最低 / 最高价格、对应国家、价差和价差百分比
+# 对于历史表，会按 Retailer / Date 分别比较
+def cross_country_spreads(df, fx_rates=None):
+    priced = df if f"Price ({BASE_CURRENCY})" in df.columns else add_numeric_prices(df, fx_rates)
+    keys = [column for column in ("Retailer", "Date", "Product ID") if column in priced.columns]
+    value = f"Price ({BASE_CURRENCY})"
+
+    table = priced.pivot_table(index=keys, columns="Country", values=value, aggfunc="last")
+    if table.empty:
+        # 没有任何可识别的价格（全部 ERROR / N/A，或结果表为空）
+        return pd.DataFrame(columns=keys + ["Product Name"] + SPREAD_COLUMNS)
+    countries = [country for country in COUNTRY_CURRENCY if country in table.columns]
+    table = table[countries + [country for country in table.columns if country not in countries]]
+
+    prices = table.to_numpy(dtype="float64")
+    has_price = ~np.isnan(prices).all(axis=1)
+    filled_low = np.where(np.isnan(prices), np.inf, prices)
+    filled_high = np.where(np.isnan(prices), -np.inf, prices)
+    columns = np.array(table.columns)
+
+    table["Min"] = np.where(has_price, filled_low.min(axis=1), np.nan)
+    table["Max"] = np.where(has_price, filled_high.max(axis=1), np.nan)
+    table["Cheapest"] = np.where(has_price, columns[filled_low.argmin(axis=1)], None)
+    table["Most Expensive"] = np.where(has_price, columns[filled_high.argmax(axis=1)], None)
+    table["Spread"] = (table["Max"] - table["Min"]).round(2)
+    table["Spread %"] = (table["Spread"] / table["Min"] * 100).where(table["Min"] > 0).round(1)
+
+    names = priced.groupby(keys)["Product Name"].last()
+    table.insert(0, "Product Name", names.reindex(table.index))
+    table.columns.name = None
+    return table.reset_index()
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+from datetime import datetime
+
+# 价格历史库（SQLite）：每次批量抓取都追加一批记录，
+# 可按 (零售商, 国家, 产品编号, 日期) 查询，并导出与上一次运行相比价格有变化的行
+
+DB_PATH = os.environ.get("PRICE_HISTORY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_history.db"))
+
+HISTORY_COLUMNS = ["Retailer", "Country", "Product ID", "Product Name", "Product URL", "Regular Price", "Promo Price", "Date", "Run ID"]
+
+# 零售商页面上的商品标题和商品编号（目前只有 Kjell 有），沿用上一次结果时需要
+DETAIL_COLUMNS = ["Title", "Retailer Item ID"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    retailer TEXT NOT NULL,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prices (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    retailer TEXT NOT NULL,
+    country TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    product_name TEXT,
+    product_url TEXT,
+    regular_price TEXT,
+    promo_price TEXT,
+    date TEXT NOT NULL,
+    title TEXT,
+    retailer_item_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_prices_key ON prices (retailer, country, product_id, date);
+CREATE INDEX IF NOT EXISTS idx_prices_run ON prices (run_id, country, product_id);
+"""
+
+
+def connect(db_path=None):
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    # 旧版本创建的库没有商品标题 / 商品编号列
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(prices)")}
+    for column in ("title", "retailer_item_id"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE prices ADD COLUMN {column} TEXT")
+    return conn
+
+
+# 追加一次运行的结果，返回 run_id
+# rows 可以是列表或生成器（逐行写入），每一项为 dict，键为：Country / Product ID / Product Name / Product URL / Regular Price / Promo Price / Date
+# 以及可选的 Title / Retailer Item ID
+def record_run(retailer, rows, db_path=None):
+    now = datetime.now()
+    conn = connect(db_path)
+    try:
+        with conn:
+            cur = conn.execute("INSERT INTO runs (retailer, started_at) VALUES (?, ?)",
+                               (retailer, now.isoformat(timespec="seconds")))
+            run_id = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO prices (run_id, retailer, country, product_id, product_name, product_url,"
+                " regular_price, promo_price, date, title, retailer_item_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((
+                    run_id,
+                    retailer,
+                    row.get("Country", ""),
+                    str(row["Product ID"]),
+                    row.get("Product Name"),
+                    row.get("Product URL"),
+                    row.get("Regular Price"),
+                    row.get("Promo Price"),
+                    row.get("Date") or now.strftime("%Y-%m-%d"),
+                    row.get("Title"),
+                    row.get("Retailer Item ID"),
+                ) for row in rows)
+            )
+        return run_id
+    finally:
+        conn.close()
+
+
+def _to_dataframe(cursor_rows, columns=HISTORY_COLUMNS):
+    import pandas as pd
+    return pd.DataFrame(cursor_rows, columns=columns)
+
+
+_SELECT = ("SELECT retailer, country, product_id, product_name, product_url, regular_price, promo_price, date, run_id"
+           " FROM prices")
+
+
+# 查询历史价格；参数均为可选过滤条件，日期格式为 YYYY-MM-DD
+def query_history(retailer=None, country=None, product_id=None, since=None, until=None, db_path=None):
+    conditions = []
+    params = []
+    for column, value in (("retailer", retailer), ("country", country), ("product_id", product_id)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(str(value))
+    if since is not None:
+        conditions.append("date >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("date <= ?")
+        params.append(until)
+
+    sql = _SELECT
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY retailer, country, product_id, date, run_id"
+
+    conn = connect(db_path)
+    try:
+        return _to_dataframe(conn.execute(sql, params).fetchall())
+    finally:
+        conn.close()
+
+
+# 返回某次运行（默认为该零售商最近一次）中，常规价或促销价与该 (国家, 产品) 上一次被抓取时不同的行（包括新出现的产品）
+# 上一次抓取不一定在上一次运行中：自适应刷新跳过的任务不写入历史，跳过后再次抓取时与跳过之前的记录比较
+def changed_since_previous_run(retailer, run_id=None, db_path=None):
+    conn = connect(db_path)
+    try:
+        if run_id is None:
+            run_id = conn.execute("SELECT MAX(run_id) FROM runs WHERE retailer = ?", (retailer,)).fetchone()[0]
+        if run_id is None:
+            return _to_dataframe([])
+
+        sql = (
+            "SELECT retailer, country, product_id, product_name, product_url, regular_price, promo_price, date, run_id"
+            " FROM ("
+            "   SELECT *, rowid AS row_order,"
+            "     LAG(run_id) OVER w AS prev_run_id,"
+            "     LAG(regular_price) OVER w AS prev_regular_price,"
+            "     LAG(promo_price) OVER w AS prev_promo_price"
+            "   FROM prices WHERE retailer = ? AND run_id <= ?"
+            "   WINDOW w AS (PARTITION BY country, product_id ORDER BY run_id, rowid)"
+            " ) WHERE run_id = ?"
+            "   AND (prev_run_id IS NULL"
+            "        OR prev_regular_price IS NOT regular_price OR prev_promo_price IS NOT promo_price)"
+            " ORDER BY row_order"
+        )
+        return _to_dataframe(conn.execute(sql, (retailer, run_id, run_id)).fetchall())
+    finally:
+        conn.close()
+
+
+# 每个 (国家, 产品) 最近 limit 次实际抓取到的记录（按 run_id 从新到旧），用于判断价格变化频率
+# 除 HISTORY_COLUMNS 外还包括 DETAIL_COLUMNS，跳过的任务沿用上一次的商品标题 / 编号
+def recent_observations(retailer, limit=10, db_path=None):
+    sql = (
+        "SELECT retailer, country, product_id, product_name, product_url, regular_price, promo_price, date, run_id,"
+        " title, retailer_item_id"
+        " FROM ("
+        "   SELECT *, ROW_NUMBER() OVER (PARTITION BY country, product_id ORDER BY run_id DESC) AS n"
+        "   FROM prices WHERE retailer = ?"
+        " ) WHERE n <= ?"
+        " ORDER BY country, product_id, run_id DESC"
+    )
+    conn = connect(db_path)
+    try:
+        return _to_dataframe(conn.execute(sql, (retailer, limit)).fetchall(), HISTORY_COLUMNS + DETAIL_COLUMNS)
+    finally:
+        conn.close()
@@ -0,0 +1,130 @@
+import time
+
+from canonical_urls import canonical_url
+from fetch_engine import iter_fetch_as_completed
+from mapping_loader import GITHUB_RAW_URL, load_mapping_csv
+from search_index import get_index
+from retailers import (
+    ELKJOP_URL_TEMPLATES,
+    KOMPLETT_URL_TEMPLATES,
+    KJELL_URL_TEMPLATE,
+    extract_elkjop_prices,
+    extract_komplett_prices,
+    extract_kjell_info,
+)
+
+# 跨零售商查询同一个型号：按型号名称在各零售商的对照表中找到产品编号，
+# 所有零售商 × 国家一起并发查询，共用一个总时限，慢的或失败的站点不会拖住整个结果表
+
+# Kjell 的 Google Sheet 数据源（Kjell.py 中的选项名 -> 导出 CSV 的链接）
+KJELL_SHEET_URLS = {
+    "CN competitors": "https://docs.google.com/spreadsheets/d/1k5GJEo0IVzxOHc-NhccbyWBD4fDsXluLoSA9_7v1fLY/export?format=csv",
+    "CE competitors": "https://docs.google.com/spreadsheets/d/1k5GJEo0IVzxOHc-NhccbyWBD4fDsXluLoSA9_7v1fLY/export?format=csv",
+    "TP-Link+Mercusys": "https://docs.google.com/spreadsheets/d/1DBUtjPe7YIgE_hNL5Dh6rc83EJ43tlHumyik_IVmejA/export?format=csv",
+}
+
+# 零售商 -> 对照表链接（按顺序查找，同一零售商的多个表合并）
+MAPPING_SOURCES = {
+    "Elkjop": [GITHUB_RAW_URL + "product_mapping.csv"],
+    "Komplett": [GITHUB_RAW_URL + "KPL.csv"],
+    "Kjell": list(dict.fromkeys(KJELL_SHEET_URLS.values())),
+}
+
+# 每个零售商最多查询的匹配产品数（名称部分匹配到多个产品时）
+MAX_MATCHES_PER_RETAILER = 3
+
+# 部分匹配时只使用前缀匹配（分数不低于此值）的结果，不为拼写相近的其他型号发出请求
+PREFIX_SCORE = 0.9
+
+# 默认总时限（秒）
+LOOKUP_DEADLINE = 10
+
+LOOKUP_COLUMNS = ["Retailer", "Country", "Product ID", "Product Name", "Product URL", "Regular Price", "Promo Price",
+                  "Discount Info", "Status", "Seconds"]
+
+PENDING, OK, FAILED, TIMED_OUT = "pending", "ok", "error", "timed out"
+
+
+# 各零售商对照表的搜索索引（来源为对照表链接，见 search_index.py）；加载失败的表不参与
+def load_catalog_index(sources=None):
+    urls = [url for urls in (sources or MAPPING_SOURCES).values() for url in urls]
+    return get_index({url: load_mapping_csv(url) for url in urls})
+
+
+# 在每个零售商的对照表中查找型号：名称完全相同（忽略大小写和标点）或编号相同的优先，
+# 没有时使用名称或名称中某个单词以该型号开头的产品（例如 "ax23" 匹配 "Archer AX23"）
+# 返回 {零售商: [(Product ID, Product Name), ...]}，没有匹配的零售商不出现
+def match_products(query, index, sources=None):
+    matches = {}
+    for retailer, urls in (sources or MAPPING_SOURCES).items():
+        results = index.search(query, limit=MAX_MATCHES_PER_RETAILER * 4, sources=urls)
+        exact = [result for result in results if result[3] >= 1.0]
+        found = exact or [result for result in results if result[3] >= PREFIX_SCORE]
+        found = list(dict.fromkeys((product_id, product_name) for product_id, product_name, _, _ in found))
+        if found:
+            matches[retailer] = found[:MAX_MATCHES_PER_RETAILER]
+    return matches
+
+
+# Kjell 的提取函数按产品编号查询，这里换成 (URL) -> (常规价, 促销价, 折扣信息) 的形式：
+# 页面上只有当前价格和折扣标签（例如 "-25%"），促销价记为 N/A，折扣标签单独放在 Discount Info 列，
+# 避免把折扣标签当成价格解析
+def _extract_kjell_prices(url, use_cache=True):
+    price, discount, _, _ = extract_kjell_info(url[len(KJELL_URL_TEMPLATE.format("")):], use_cache=use_cache)
+    return price, "N/A", discount
+
+
+# 零售商 -> (各国家 URL 模板, 提取函数)
+LOOKUP_RETAILERS = {
+    "Elkjop": (ELKJOP_URL_TEMPLATES, extract_elkjop_prices),
+    "Komplett": (KOMPLETT_URL_TEMPLATES, extract_komplett_prices),
+    "Kjell": ({"Sweden": KJELL_URL_TEMPLATE}, _extract_kjell_prices),
+}
+
+
+# 把匹配结果展开为查询任务：[零售商, 国家, Product ID, Product Name, URL]（同一 URL 只查询一次）
+def build_tasks(matches):
+    tasks = []
+    seen = set()
+    for retailer, products in matches.items():
+        url_templates, _ = LOOKUP_RETAILERS[retailer]
+        for product_id, product_name in products:
+            for country, template in url_templates.items():
+                url = template.format(product_id)
+                if url not in seen:
+                    seen.add(url)
+                    tasks.append([retailer, country, product_id, product_name, url])
+    return tasks
+
+
+# prices 为 (常规价, 促销价) 或 (常规价, 促销价, 折扣信息)
+def _row(task, prices, status, seconds):
+    retailer, country, product_id, product_name, url = task
+    discount_info = prices[2] if len(prices) > 2 else ""
+    return [retailer, country, product_id, product_name, canonical_url(url), prices[0], prices[1], discount_info,
+            status, seconds]
+
+
+# 并发查询所有任务，每完成一个任务 yield 一次当前的结果表（LOOKUP_COLUMNS 顺序的行列表），
+# 还没有结果的行状态为 pending；到达总时限后最后 yield 一次，未完成的行标记为 timed out
+# Kjell 的当前价格记为 Regular Price，折扣标签记为 Discount Info
+def iter_lookup(tasks, deadline=LOOKUP_DEADLINE, use_cache=True):
+    start = time.perf_counter()
+    rows = [_row(task, ("", ""), PENDING, None) for task in tasks]
+    yield rows
+
+    retailers_by_url = {task[4]: task[0] for task in tasks}
+
+    def extract(url):
+        return LOOKUP_RETAILERS[retailers_by_url[url]][1](url, use_cache=use_cache)
+
+    results = iter_fetch_as_completed([task[4] for task in tasks], extract, deadline, error_result=("ERROR", "ERROR"))
+    for idx, prices in results:
+        status = FAILED if "ERROR" in prices else OK
+        rows[idx] = _row(tasks[idx], prices, status, round(time.perf_counter() - start, 2))
+        yield rows
+
+    for idx, row in enumerate(rows):
+        if row[8] == PENDING:
+            rows[idx] = _row(tasks[idx], ("", ""), TIMED_OUT, None)
+    yield rows
@@ -0,0 +1,129 @@
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# 按域名的自适应限速器（令牌桶 + AIMD）：
+# 响应正常时逐步提高速率（加法增长），遇到 429/503 或 Retry-After 时速率减半并暂停（乘法减少）
+
+# 各零售商的限速配置（按域名关键字匹配），rate 为每秒请求数
+#   rate     - 初始速率
+#   min_rate - 退避后的最低速率
+#   max_rate - 正常时可以增长到的最高速率
+#   burst    - 令牌桶容量（允许的突发请求数）
+RATE_LIMITS = {
+    "kjell": {"rate": 0.7, "min_rate": 0.2, "max_rate": 4.0, "burst": 2},
+    "komplett": {"rate": 2.0, "min_rate": 0.2, "max_rate": 8.0, "burst": 4},
+    "elgiganten": {"rate": 4.0, "min_rate": 0.5, "max_rate": 16.0, "burst": 4},
+    "elkjop": {"rate": 4.0, "min_rate": 0.5, "max_rate": 16.0, "burst": 4},
+    "gigantti": {"rate": 4.0, "min_rate": 0.5, "max_rate": 16.0, "burst": 4},
+}
+DEFAULT_RATE_LIMIT = {"rate": 2.0, "min_rate": 0.2, "max_rate": 8.0, "burst": 2}
+
+# 每次成功响应增加的速率（请求/秒）
+ADDITIVE_INCREASE = 0.1
+
+# 被限流时速率乘以的系数
+MULTIPLICATIVE_DECREASE = 0.5
+
+# 视为被限流的状态码
+THROTTLE_STATUS_CODES = (429, 503)
+
+# Retry-After 最长等待时间（秒），防止异常值卡住整个任务
+MAX_RETRY_AFTER = 120
+
+
+class TokenBucket:
+    def __init__(self, rate, min_rate, max_rate, burst):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # 阻塞直到拿到一个令牌
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    # 响应正常：加法增长
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+
+    # 被限流：乘法减少，并按 Retry-After 暂停该域名
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+            self.tokens = 0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + min(retry_after, MAX_RETRY_AFTER))
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_config(host):
+    for keyword, config in RATE_LIMITS.items():
+        if keyword in host:
+            return config
+    return DEFAULT_RATE_LIMIT
+
+
+# 获取某个 URL 所在域名的令牌桶（按需创建，线程安全）
+def get_bucket(url):
+    host = urlparse(url).netloc
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(**get_rate_config(host))
+            _buckets[host] = bucket
+        return bucket
+
+
+# 解析 Retry-After（秒数或 HTTP 日期），无法解析时返回 None
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# 等待限速许可
+def acquire(url):
+    get_bucket(url).acquire()
+
+
+# 根据响应调整该域名的速率；返回 True 表示被限流
+def record_response(url, response):
+    bucket = get_bucket(url)
+    if response.status_code in THROTTLE_STATUS_CODES:
+        bucket.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+        return True
+    bucket.on_success()
+    return False
@@ -0,0 +1,105 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+from price_history import recent_observations
+
+# 按价格变化频率决定每个 (产品, 国家) 本次是否需要重新抓取：
+#   - 从未抓取过、上次出错、正在促销、最近几次有变化、同一产品在其他国家刚有变化 -> 每次都抓取
+#   - 其余按稳定程度间隔若干天再抓取，跳过的任务沿用上一次的价格，并在报告中说明原因
+# 跳过的任务不写入价格历史库，历史中只保留实际抓取到的记录
+# 稳定程度按日期计算：同一天运行多次只算一次（取当天最后一次抓取），避免一天内连续运行几次就被判定为稳定
+
+# 每个 (产品, 国家) 读取的最近抓取次数（按日期合并前）
+HISTORY_OBSERVATIONS = 30
+
+# 最近这么多天的抓取中价格有变化时视为波动产品，每次都抓取
+VOLATILE_DAYS = 3
+
+# 历史中有过变化（但最近没有）的产品的抓取间隔（天）
+MODERATE_INTERVAL_DAYS = 2
+
+# 历史中从未变化的产品的抓取间隔（天），也是任何产品不被抓取的最长时间
+# 只有一个国家的零售商（Kjell）没有“其他国家刚有变化”的提示，间隔不宜过长，以免错过促销开始
+STABLE_INTERVAL_DAYS = 3
+
+# 不到这么多天的历史记录时无法判断稳定性，每次都抓取
+MIN_OBSERVATIONS = 3
+
+# 表示“没有促销”的促销价 / 折扣值
+NO_PROMO_VALUES = ("", "N/A", None)
+
+ERROR_VALUES = ("ERROR",)
+
+REPORT_COLUMNS = ["Product ID", "Country", "Decision", "Reason", "Last Fetched", "Changes", "Observations"]
+
+
+# 计算抓取计划：
+#   retailer - 价格历史库中的零售商名称（Elkjop / Kjell / Komplett）
+#   keys     - 本次所有任务的 (Product ID, Country)
+# 返回 (需要抓取的 key 集合, {跳过的 key: 上一次的记录}, 报告 DataFrame)
+def plan_refresh(retailer, keys, today=None, db_path=None):
+    today = today or date.today()
+    history = recent_observations(retailer, HISTORY_OBSERVATIONS, db_path)
+
+    # 每个 key 每天最后一次抓取的记录，按日期从新到旧
+    observations = {}
+    for row in history.to_dict("records"):
+        rows = observations.setdefault((row["Product ID"], row["Country"]), [])
+        if not rows or rows[-1]["Date"] != row["Date"]:
+            rows.append(row)
+
+    # 最近一次抓取中价格有变化的产品（任一国家），视为活动开始 / 结束，所有国家都抓取
+    changed_products = {
+        key[0] for key, rows in observations.items()
+        if len(rows) > 1 and _price(rows[0]) != _price(rows[1])
+    }
+
+    to_fetch = set()
+    skipped = {}
+    report = []
+    for key in keys:
+        key = (str(key[0]), key[1])
+        rows = observations.get(key, [])
+        changes = _count_changes(rows)
+        decision, reason = _decide(key, rows, changes, changed_products, today)
+        if decision == "fetch":
+            to_fetch.add(key)
+        else:
+            skipped[key] = rows[0]
+        report.append([key[0], key[1], decision, reason, rows[0]["Date"] if rows else "", changes, len(rows)])
+
+    return to_fetch, skipped, pd.DataFrame(report, columns=REPORT_COLUMNS)
+
+
+def _price(row):
+    return row["Regular Price"], row["Promo Price"]
+
+
+def _count_changes(rows):
+    return sum(1 for newer, older in zip(rows, rows[1:]) if _price(newer) != _price(older))
+
+
+def _decide(key, rows, changes, changed_products, today):
+    if not rows:
+        return "fetch", "never fetched"
+    latest = rows[0]
+    if latest["Regular Price"] in ERROR_VALUES or latest["Promo Price"] in ERROR_VALUES:
+        return "fetch", "last fetch failed"
+    if latest["Promo Price"] not in NO_PROMO_VALUES:
+        return "fetch", "active promo"
+    if _count_changes(rows[:VOLATILE_DAYS + 1]):
+        return "fetch", f"changed in the last {VOLATILE_DAYS} fetch days"
+    if key[0] in changed_products:
+        return "fetch", "price changed in another country"
+    if len(rows) < MIN_OBSERVATIONS:
+        return "fetch", "not enough history"
+
+    interval = MODERATE_INTERVAL_DAYS if changes else STABLE_INTERVAL_DAYS
+    try:
+        age = (today - datetime.strptime(latest["Date"], "%Y-%m-%d").date()).days
+    except (TypeError, ValueError):
+        return "fetch", "unknown last fetch date"
+    if age >= interval:
+        return "fetch", f"due (last fetched {age} days ago, interval {interval} days)"
+    return "skip", f"stable ({changes} changes over {len(rows)} fetch days), next fetch in {interval - age} days"
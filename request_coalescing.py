@@ -0,0 +1,85 @@
+import time
+import threading
+from collections import OrderedDict
+
+# 进程内的请求合并（singleflight）+ 短期内存缓存：
+# Streamlit 的所有会话运行在同一个进程中，多人同时查询同一个产品时，
+# 相同 URL 的并发请求只发出一次，其余请求等待并共享结果；结果在内存中保留 MEMORY_TTL 秒
+
+# 内存缓存有效期（秒）
+MEMORY_TTL = 30
+
+# 内存缓存最多保留的条目数（超出时淘汰最久未使用的条目）
+MEMORY_MAX_ENTRIES = 64
+
+_entries = OrderedDict()  # key -> (过期时间, 结果)
+_inflight = {}  # key -> _Call
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+
+# 一次正在进行的请求，其他线程等待 done 后读取 result / error
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# 读取 key 对应的结果：
+#   fetch        - 未命中时调用的抓取函数（无参数）
+#   use_cached   - False 时不读取内存缓存（对应 "Bypass cache"），但仍会合并同时进行的请求
+#   should_cache - 判断结果是否可以放入内存缓存，例如不缓存 5xx 响应
+# fetch 抛出的异常会传给所有等待中的调用方，且不会被缓存
+def coalesce(key, fetch, use_cached=True, should_cache=None, ttl=None):
+    ttl = MEMORY_TTL if ttl is None else ttl
+    with _lock:
+        entry = _entries.get(key)
+        if use_cached and entry is not None and entry[0] > time.monotonic():
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[1]
+        call = _inflight.get(key)
+        if call is not None:
+            _stats["coalesced"] += 1
+            leader = False
+        else:
+            call = _Call()
+            _inflight[key] = call
+            _stats["misses"] += 1
+            leader = True
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fetch()
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _inflight[key]
+            if call.error is None and ttl > 0 and (should_cache is None or should_cache(call.result)):
+                _entries[key] = (time.monotonic() + ttl, call.result)
+                _entries.move_to_end(key)
+                while len(_entries) > MEMORY_MAX_ENTRIES:
+                    _entries.popitem(last=False)
+        call.done.set()
+    return call.result
+
+
+# 命中统计：hits = 内存缓存命中，coalesced = 合并到正在进行的请求，misses = 实际发出的请求
+def get_stats():
+    with _lock:
+        return dict(_stats, entries=len(_entries))
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from functools import wraps
+from urllib.parse import urlparse
+
+# 请求和解析的耗时统计：
+#   - 开启跟踪时，每次请求 / 重试 / 解析都写一行到 JSON-lines 跟踪文件（可用 pandas.read_json(path, lines=True) 读取）
+#   - 同时在内存中按域名汇总，供 Streamlit 侧边栏显示
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 跟踪文件路径；默认不写文件，设置环境变量 REQUEST_TRACE=1 开启（内存汇总不受影响）
+TRACE_FILE = os.environ.get("REQUEST_TRACE_FILE", os.path.join(BASE_DIR, ".traces", "requests.jsonl"))
+TRACE_ENABLED = os.environ.get("REQUEST_TRACE", "0") == "1"
+
+# 跟踪文件超过这个大小（字节）时改名为 <TRACE_FILE>.1（覆盖上一个），重新开始写
+MAX_TRACE_BYTES = 50 * 1024 * 1024
+
+# 每个域名 / 解析函数保留的最近耗时样本数（用于计算分位数）
+MAX_SAMPLES = 2000
+
+_lock = threading.Lock()
+_trace_file = None
+_hosts = {}
+_parsers = {}
+
+
+def _host_stats(host):
+    stats = _hosts.get(host)
+    if stats is None:
+        stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "retries": 0,
+            "errors": 0,
+            "bytes": 0,
+            "statuses": Counter(),
+            "latencies": deque(maxlen=MAX_SAMPLES),
+            "ttfb": deque(maxlen=MAX_SAMPLES),
+        }
+        _hosts[host] = stats
+    return stats
+
+
+# 追加一行跟踪记录（调用方已持有 _lock）
+def _trace(event):
+    global _trace_file
+    if not TRACE_ENABLED:
+        return
+    try:
+        if _trace_file is None:
+            os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            _trace_file = open(TRACE_FILE, "a", encoding="utf-8")
+        event["ts"] = datetime.now().isoformat(timespec="milliseconds")
+        _trace_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+        _trace_file.flush()
+        if _trace_file.tell() >= MAX_TRACE_BYTES:
+            _trace_file.close()
+            _trace_file = None
+            os.replace(TRACE_FILE, TRACE_FILE + ".1")
+    except OSError:
+        pass  # 跟踪文件写不进去时不影响抓取
+
+
+# 记录一次网络请求：
+#   elapsed - 从发出请求到拿到响应（非流式时包含下载正文）的秒数
+#   attempt - 第几次尝试（0 为首次，大于 0 为限流后的重试）
+#   error   - 请求抛出异常时的错误信息
+# 流式请求此时还没有读取正文，流量由 record_stream_read 按实际读取的字节数统计
+def record_fetch(url, response=None, elapsed=0.0, attempt=0, stream=False, error=None):
+    host = urlparse(url).netloc
+    event = {"event": "fetch", "host": host, "url": url, "ms": round(elapsed * 1000, 1), "attempt": attempt}
+    if response is not None:
+        if stream:
+            size = 0
+        else:
+            size = len(response.content)
+        event.update({
+            "status": response.status_code,
+            "ttfb_ms": round(response.elapsed.total_seconds() * 1000, 1),
+            "bytes": size,
+            "redirects": len(response.history),
+            "stream": stream,
+        })
+    if error is not None:
+        event["error"] = str(error)
+
+    with _lock:
+        stats = _host_stats(host)
+        stats["requests"] += 1
+        stats["latencies"].append(event["ms"])
+        if attempt:
+            stats["retries"] += 1
+        if response is not None:
+            stats["bytes"] += event["bytes"]
+            stats["statuses"][response.status_code] += 1
+            stats["ttfb"].append(event["ttfb_ms"])
+        else:
+            stats["errors"] += 1
+        _trace(event)
+
+
+# 记录流式请求实际读取的正文字节数（提前停止时小于整个页面）
+def record_stream_read(url, size):
+    host = urlparse(url).netloc
+    with _lock:
+        _host_stats(host)["bytes"] += size
+        _trace({"event": "stream_read", "host": host, "url": url, "bytes": size})
+
+
+# 记录一次本地缓存命中（磁盘缓存直接返回，没有发出请求）
+def record_cache_hit(url, elapsed):
+    host = urlparse(url).netloc
+    with _lock:
+        _host_stats(host)["cache_hits"] += 1
+        _trace({"event": "cache_hit", "host": host, "url": url, "ms": round(elapsed * 1000, 1)})
+
+
+# 记录提取函数自身的重试（例如 Komplett 请求失败后等待重试）
+def record_retry(url, reason):
+    host = urlparse(url).netloc
+    with _lock:
+        _host_stats(host)["retries"] += 1
+        _trace({"event": "retry", "host": host, "url": url, "error": str(reason)})
+
+
+def record_parse(name, elapsed, size=None):
+    with _lock:
+        samples = _parsers.get(name)
+        if samples is None:
+            samples = _parsers[name] = deque(maxlen=MAX_SAMPLES)
+        samples.append(elapsed * 1000)
+        _trace({"event": "parse", "parser": name, "ms": round(elapsed * 1000, 2), "bytes": size})
+
+
+# 装饰器：统计解析函数的耗时（第一个参数为 HTML 文本时同时记录其长度）
+def timed_parse(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            size = len(args[0]) if args and isinstance(args[0], (str, bytes)) else None
+            record_parse(func.__name__, time.perf_counter() - start, size)
+    return wrapper
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return round(ordered[index], 1)
+
+
+# 按域名汇总：请求数、缓存命中、重试、错误、流量、状态码和延迟分位数（毫秒）
+def host_summary():
+    with _lock:
+        rows = []
+        for host, stats in sorted(_hosts.items()):
+            rows.append({
+                "Host": host,
+                "Requests": stats["requests"],
+                "Cache hits": stats["cache_hits"],
+                "Retries": stats["retries"],
+                "Errors": stats["errors"],
+                "KB": round(stats["bytes"] / 1024, 1),
+                "Status codes": ", ".join(f"{code}×{count}" for code, count in sorted(stats["statuses"].items())),
+                "p50 ms": _percentile(stats["latencies"], 50),
+                "p95 ms": _percentile(stats["latencies"], 95),
+                "TTFB p50 ms": _percentile(stats["ttfb"], 50),
+            })
+        return rows
+
+
+# 按解析函数汇总耗时（毫秒）
+def parse_summary():
+    with _lock:
+        return [
+            {
+                "Parser": name,
+                "Samples": len(samples),
+                "p50 ms": _percentile(samples, 50),
+                "p95 ms": _percentile(samples, 95),
+            }
+            for name, samples in sorted(_parsers.items())
+        ]
+
+
+def reset():
+    with _lock:
+        _hosts.clear()
+        _parsers.clear()
@@ -0,0 +1,560 @@
+import re
+import time
+import random
+import threading
+import importlib.util
+from datetime import datetime
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+import html_archive
+import canonical_urls
+import rate_limiter
+import request_coalescing
+import request_metrics
+
+# 各零售商共享的抓取逻辑：每个域名一个带连接池的 requests.Session（keep-alive），
+# 以及 Elkjop / Komplett / Kjell 的价格提取函数
+
+# 优先使用 lxml 解析器（更快），未安装时退回到内置的 html.parser
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# Elkjop 国家网站模板，按要求顺序排列
+ELKJOP_URL_TEMPLATES = {
+    "Sweden": "https://www.elgiganten.se/product/{}",
+    "Norway": "https://www.elkjop.no/product/{}",
+    "Finland": "https://www.gigantti.fi/product/{}",
+    "Denmark": "https://www.elgiganten.dk/product/{}",
+}
+
+# Komplett 国家网站模板
+KOMPLETT_URL_TEMPLATES = {
+    "Sweden": "https://www.komplett.se/product/{}",
+    "Norway": "https://www.komplett.no/product/{}",
+    "Denmark": "https://www.komplett.dk/product/{}",
+}
+
+# Kjell 商品页模板
+KJELL_URL_TEMPLATE = "https://www.kjell.com/se/{}"
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0", "Connection": "keep-alive"}
+
+# 连接池设置：每个域名保留的连接数（应不小于 fetch_engine.MAX_PER_HOST）
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+# 获取某个域名对应的共享 Session（按需创建，线程安全）
+def get_session(url):
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _sessions[host] = session
+        return session
+
+
+# 快速解析模式：只解析价格 / meta 相关节点（SoupStrainer），关闭后回到完整解析
+FAST_PARSING = True
+
+
+# 用函数 wanted(标签名, 属性 dict) 决定是否保留标签的解析过滤器，
+# 用于一次解析同时保留几种不同的标签（多个 SoupStrainer 需要把页面解析多次）
+def _tag_filter(wanted):
+    try:
+        from bs4.filter import ElementFilter
+    except ImportError:
+        # beautifulsoup4 4.13 之前：SoupStrainer 的名称函数同时收到标签名和属性
+        from bs4 import SoupStrainer
+        return SoupStrainer(lambda name, attrs=None: wanted(name, attrs or {}))
+
+    class TagFilter(ElementFilter):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return wanted(name, attrs or {})
+
+        def allow_string_creation(self, string):
+            return False
+
+    return TagFilter()
+
+
+# 构建 BeautifulSoup 对象；快速模式下使用 HTML_PARSER 并只保留 strain 匹配的节点：
+# strain 为 (name, attrs)，或函数 wanted(标签名, 属性 dict)（见 _tag_filter）
+# bs4 / lxml 在这里才导入，页面首次渲染时不需要加载解析器
+def make_soup(html, strain=None):
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    if FAST_PARSING:
+        if callable(strain):
+            parse_only = _tag_filter(strain)
+        else:
+            parse_only = SoupStrainer(*strain) if strain else None
+        return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+    return BeautifulSoup(html, 'html.parser')
+
+
+# 被限流（429/503）时的最多重试次数
+THROTTLE_RETRIES = 2
+
+
+# 实际发送请求：先等待该域名的限速许可，被限流时按 Retry-After 退避后重试
+def _send(url, headers=None, timeout=20, allow_redirects=True, stream=False):
+    session = get_session(url)
+    for attempt in range(THROTTLE_RETRIES + 1):
+        rate_limiter.acquire(url)
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, timeout=timeout, allow_redirects=allow_redirects, stream=stream)
+        except Exception as e:
+            request_metrics.record_fetch(url, elapsed=time.perf_counter() - start, attempt=attempt, error=e)
+            raise
+        request_metrics.record_fetch(url, response, time.perf_counter() - start, attempt, stream)
+        if not rate_limiter.record_response(url, response):
+            break
+        if attempt < THROTTLE_RETRIES:
+            response.close()
+    return response
+
+
+# 可以放入内存缓存的响应（服务器错误和限流响应不缓存）
+def _is_cacheable_response(response):
+    return response.status_code < 500 and response.status_code not in rate_limiter.THROTTLE_STATUS_CODES
+
+
+# 通过共享 Session 发送 GET 请求；use_cache=False 时跳过本地磁盘缓存和内存缓存（对应界面上的 "Bypass cache"）
+# 多个会话同时请求同一个 URL 时只发出一次请求（见 request_coalescing.py）
+def http_get(url, headers=None, timeout=20, allow_redirects=True, use_cache=True):
+    def fetch():
+        start = time.perf_counter()
+        response = http_cache.cached_get(_send, url, headers=headers, timeout=timeout,
+                                         allow_redirects=allow_redirects, bypass=not use_cache)
+        if getattr(response, "from_cache", False):
+            request_metrics.record_cache_hit(url, time.perf_counter() - start)
+        return response
+
+    # 请求头不参与合并：Komplett 每次请求随机选择 User-Agent，不影响页面内容
+    key = ("GET", url, allow_redirects)
+    return request_coalescing.coalesce(key, fetch, use_cached=use_cache, should_cache=_is_cacheable_response)
+
+
+# 正则表达式：只提取数字和符号（例如，`,`和`.-`）
+def clean_price(price_text):
+    cleaned_price = re.sub(r'[^\d,.-]', '', price_text).strip()
+    return cleaned_price
+
+
+def get_random_user_agent():
+    # 定义多个常见的 User-Agent
+    user_agents = [
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_4_0) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    ]
+
+    # 检查是否有有效的 User-Agent
+    if not user_agents:
+        raise ValueError("User-Agent list is empty!")
+
+    return random.choice(user_agents)
+
+
+# ---------------- Elkjop ----------------
+
+ELKJOP_REGULAR_PRICE_CLASS = 'grid grid-cols-subgrid grid-rows-subgrid row-span-2 gap-1 items-end'
+ELKJOP_PROMO_PRICE_CLASS = 'font-regular flex flex-shrink px-1 items-center text-base'
+
+# 只保留常规价格 div 和促销价格 span（及其子节点）
+ELKJOP_STRAINER = (['div', 'span'], {'class': [ELKJOP_REGULAR_PRICE_CLASS, ELKJOP_PROMO_PRICE_CLASS]})
+
+
+# 从商品页面（或列表页中的单个商品卡片）节点中读取 (常规价格, 促销价格)
+def _elkjop_prices(node):
+    # 提取常规价格
+    price_element = node.find('div', {'class': ELKJOP_REGULAR_PRICE_CLASS})
+    if price_element:
+        inc_vat_price = price_element.find('span', {'class': 'inc-vat'})
+        regular_price = inc_vat_price.get_text(strip=True) if inc_vat_price else 'N/A'
+    else:
+        regular_price = 'N/A'
+    regular_price = clean_price(regular_price)
+
+    # 提取促销价格
+    promo_price_element = node.find('span', {'class': ELKJOP_PROMO_PRICE_CLASS})
+    if promo_price_element:
+        promo_price = promo_price_element.find('span', {'class': 'inc-vat'})
+        if promo_price:
+            promo_price_text = promo_price.get_text(strip=True)
+            promo_price_value = promo_price_text.replace('Førpris: ', '').replace('Tidigare pris', '').strip()
+            promo_price = clean_price(promo_price_value)
+        else:
+            promo_price = 'N/A'
+    else:
+        promo_price = 'N/A'
+
+    if promo_price != 'N/A':
+        regular_price, promo_price = promo_price, regular_price
+
+    return regular_price, promo_price
+
+
+# 从 Elkjop 商品页面 HTML 中解析价格
+@request_metrics.timed_parse
+def parse_elkjop_prices(html):
+    return _elkjop_prices(make_soup(html, ELKJOP_STRAINER))
+
+
+# 下载 Elkjop 商品页面 HTML：
+#   已知规范 URL 时直接请求（不跟随重定向），返回 404 或再次重定向时重新解析；
+#   限流、服务器错误等暂时性的失败不说明规范 URL 失效，保留规范 URL；
+#   否则请求模板 URL 并跟随重定向，记住最终的商品页 URL
+# 重试后仍然失败（限流、服务器错误、商品不存在）时抛出 requests.HTTPError，
+# 调用方记为 ERROR，不会把错误页面解析成 N/A 当作正常结果
+def fetch_elkjop_html(url, use_cache=True):
+    canonical = canonical_urls.get(url)
+    if canonical:
+        response = http_get(canonical, allow_redirects=False, use_cache=use_cache)
+        if response.status_code == 200:
+            html_archive.archive_page(url, response.text)
+            return response.text
+        if response.status_code != 404 and not 300 <= response.status_code < 400:
+            response.raise_for_status()
+        canonical_urls.forget(url)
+        use_cache = False  # 缓存中的旧重定向结果可能指向同一个失效地址
+
+    response = http_get(url, allow_redirects=True, use_cache=use_cache)
+    if response.status_code == 200 and response.url != url and "/product/" in urlparse(response.url).path:
+        canonical_urls.remember(url, response.url)
+    response.raise_for_status()
+    html_archive.archive_page(url, response.text)
+    return response.text
+
+
+# 从 Elkjop 商品页面提取价格
+def extract_elkjop_prices(url, use_cache=True):
+    return parse_elkjop_prices(fetch_elkjop_html(url, use_cache))
+
+
+# ---------------- Elkjop 品牌列表页 ----------------
+
+# 各国家网站的品牌列表页（page 从 1 开始），例如 https://www.elgiganten.se/brand/tp-link
+ELKJOP_BRAND_LISTING_URLS = {
+    "Sweden": "https://www.elgiganten.se/brand/{brand}?page={page}",
+    "Norway": "https://www.elkjop.no/brand/{brand}?page={page}",
+    "Finland": "https://www.gigantti.fi/brand/{brand}?page={page}",
+    "Denmark": "https://www.elgiganten.dk/brand/{brand}?page={page}",
+}
+
+# 商品卡片是指向商品页的链接，名称和价格组件都在链接内部
+ELKJOP_PRODUCT_LINK_PATTERN = re.compile(r"/product/.*?(\d+)/?$")
+ELKJOP_LISTING_STRAINER = ("a", {"href": ELKJOP_PRODUCT_LINK_PATTERN})
+
+
+# 列表页上表示“没有价格”（售罄、图片链接等）的常规价
+ELKJOP_LISTING_NO_PRICE = ("", "N/A")
+
+
+# 从 Elkjop 品牌列表页 HTML 中解析每个商品的编号、名称、商品页链接和价格
+# 同一商品出现多次（图片和标题分别链接）时合并：价格取带价格的链接，名称优先取带价格或标题的链接
+# 没有价格的商品也会返回（常规价为 '' 或 N/A），调用方需要改为请求商品页
+@request_metrics.timed_parse
+def parse_elkjop_listing(html, base_url=""):
+    soup = make_soup(html, ELKJOP_LISTING_STRAINER)
+
+    records = {}
+    name_ranks = {}
+    for card in soup.find_all("a", href=ELKJOP_PRODUCT_LINK_PATTERN):
+        product_id = ELKJOP_PRODUCT_LINK_PATTERN.search(card["href"]).group(1)
+        regular_price, promo_price = _elkjop_prices(card)
+        has_price = regular_price not in ELKJOP_LISTING_NO_PRICE
+
+        record = records.get(product_id)
+        if record is None or (has_price and record["Regular Price"] in ELKJOP_LISTING_NO_PRICE):
+            record = records[product_id] = {
+                "Product ID": product_id,
+                "Product Name": record["Product Name"] if record else "",
+                "Product URL": urljoin(base_url, card["href"]),
+                "Regular Price": regular_price,
+                "Promo Price": promo_price,
+            }
+
+        title = card.find(["h2", "h3"])
+        name = card.get("title") or (title.get_text(strip=True) if title else card.get_text(" ", strip=True))
+        # 名称来源：2 带价格或标题的链接，1 其他链接的文字，0 没有文字
+        rank = 2 if has_price or card.get("title") or title else (1 if name else 0)
+        if name and rank > name_ranks.get(product_id, 0):
+            record["Product Name"] = name
+            name_ranks[product_id] = rank
+    return list(records.values())
+
+
+# ---------------- Komplett ----------------
+
+KOMPLETT_STRAINER = ('span', {'class': ['product-price-now', 'product-price-before ']})
+
+
+# 从 Komplett 商品页面 HTML 中解析价格
+@request_metrics.timed_parse
+def parse_komplett_prices(html):
+    soup = make_soup(html, KOMPLETT_STRAINER)
+
+    # 提取常规价格（当前价格）
+    price_element = soup.find('span', {'class': 'product-price-now'})
+    regular_price = price_element.get_text(strip=True) if price_element else 'N/A'
+
+    # 提取促销价格（原价）
+    promo_price_element = soup.find('span', {'class': 'product-price-before '})
+    promo_price = promo_price_element.get_text(strip=True) if promo_price_element else 'N/A'
+
+    # 如果有促销，交换价格变量
+    if promo_price != 'N/A':
+        regular_price, promo_price = promo_price, regular_price
+
+    return regular_price, promo_price
+
+
+# 下载 Komplett 商品页面 HTML（失败时等待后重试，重试用完时抛出最后一次的异常）
+def fetch_komplett_html(url, retries=3, use_cache=True):
+    headers = {
+        "User-Agent": get_random_user_agent(),
+        "Accept-Language": "en-US,en;q=0.9",
+        "Referer": "https://www.google.com/"
+    }
+
+    for attempt in range(retries):
+        try:
+            response = http_get(url, headers=headers, timeout=20, use_cache=use_cache)
+            response.raise_for_status()
+            html_archive.archive_page(url, response.text)
+            return response.text
+
+        except Exception as e:
+            if attempt < retries - 1:
+                request_metrics.record_retry(url, e)
+                time.sleep(2)  # 延时 2 秒后重试
+            else:
+                raise
+
+    raise RuntimeError("Max retries reached.")
+
+
+# 从 Komplett 商品页面提取价格（失败时重试）
+def extract_komplett_prices(url, retries=3, use_cache=True):
+    try:
+        return parse_komplett_prices(fetch_komplett_html(url, retries, use_cache))
+    except Exception as e:
+        return 'ERROR', f"Request failed: {e}"
+
+
+# ---------------- Kjell ----------------
+
+KJELL_META_PROPERTIES = ["product:price:amount", "og:title", "product:retailer_item_id"]
+
+KJELL_STICKER_TEST_ID = "campaign-product-sticker"
+
+
+# 快速解析时保留的节点：<head> 中需要的 meta 标签和正文中的促销标签，一次解析同时保留两种
+def _is_kjell_node(name, attrs):
+    if name == "meta":
+        return attrs.get("property") in KJELL_META_PROPERTIES
+    return name == "div" and attrs.get("data-test-id") == KJELL_STICKER_TEST_ID
+
+
+# 由已收集的 meta 字段（property -> 带 content 属性的标签）和折扣文本生成结果
+def _kjell_fields(meta, discount_text):
+    price = meta.get("product:price:amount")
+    if price and price.get("content"):
+        try:
+            price = f"{float(price['content']):.2f}"
+        except ValueError:
+            price = "N/A"
+    else:
+        price = "N/A"
+
+    title_tag = meta.get("og:title")
+    title = title_tag["content"] if title_tag else "N/A"
+
+    retailer_id_tag = meta.get("product:retailer_item_id")
+    retailer_id = retailer_id_tag["content"] if retailer_id_tag else "N/A"
+
+    return price, discount_text, title, retailer_id
+
+
+# 从 Kjell 商品页面 HTML 中解析价格、折扣、标题和零售商编号
+@request_metrics.timed_parse
+def parse_kjell_info(html):
+    soup = make_soup(html, _is_kjell_node)
+
+    # 一次遍历收集所有需要的 meta 字段（同名时保留第一个，与 soup.find 一致）
+    meta = {}
+    for tag in soup.find_all("meta", {"property": KJELL_META_PROPERTIES}):
+        meta.setdefault(tag["property"], tag)
+
+    discount_tag = soup.find("div", {"data-test-id": KJELL_STICKER_TEST_ID})
+    discount_text = discount_tag.get_text(strip=True) if discount_tag else "N/A"
+
+    return _kjell_fields(meta, discount_text)
+
+
+# 流式读取 Kjell 页面：边下载边用 lxml 增量解析，所有字段都找到后立即断开连接
+KJELL_STREAMING = True
+KJELL_STREAM_CHUNK_SIZE = 16 * 1024
+
+# 为 False 时，<head> 中的 meta 字段齐全即停止读取（不再等待正文中的促销标签，折扣记为 N/A）
+KJELL_STICKER_REQUIRED = True
+
+
+# 返回 (结果, 已读取的内容, 是否读完整个页面)
+# 解析耗时只统计增量解析本身（不包括等待下载），回退到完整解析时由 parse_kjell_info 统计，不重复记录
+def _stream_kjell_info(response):
+    from lxml import etree
+
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=response.encoding or "utf-8")
+    meta = {}
+    discount_text = None
+    chunks = []
+    head_done = False
+    parse_elapsed = 0.0
+
+    for chunk in response.iter_content(KJELL_STREAM_CHUNK_SIZE):
+        chunks.append(chunk)
+        start = time.perf_counter()
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if not isinstance(element.tag, str):
+                continue
+            if event == "start" and element.tag == "meta":
+                prop = element.get("property")
+                if prop in KJELL_META_PROPERTIES:
+                    meta.setdefault(prop, dict(element.attrib))
+            elif event == "end" and element.tag == "head":
+                head_done = True
+            elif (event == "end" and element.tag == "div" and discount_text is None
+                  and element.get("data-test-id") == KJELL_STICKER_TEST_ID):
+                discount_text = "".join(s.strip() for s in element.itertext() if s.strip())
+        parse_elapsed += time.perf_counter() - start
+
+        metas_found = all(prop in meta and "content" in meta[prop] for prop in KJELL_META_PROPERTIES)
+        if metas_found and (discount_text is not None or (head_done and not KJELL_STICKER_REQUIRED)):
+            response.close()
+            body = b"".join(chunks)
+            request_metrics.record_parse("_stream_kjell_info", parse_elapsed, len(body))
+            return _kjell_fields(meta, discount_text or "N/A"), body, False
+
+    body = b"".join(chunks)
+    metas_found = all(prop in meta and "content" in meta[prop] for prop in KJELL_META_PROPERTIES)
+    if metas_found:
+        # 已读完整个页面：促销标签不存在即为 N/A
+        request_metrics.record_parse("_stream_kjell_info", parse_elapsed, len(body))
+        return _kjell_fields(meta, discount_text or "N/A"), body, True
+
+    # 有字段缺失：用完整内容走原来的解析逻辑，保证结果一致
+    return parse_kjell_info(body.decode(response.encoding or "utf-8", errors="replace")), body, True
+
+
+# 下载完整的 Kjell 商品页面 HTML（多进程解析时使用，不做流式提前停止）
+def fetch_kjell_html(url, use_cache=True):
+    r = http_get(url, timeout=15, use_cache=use_cache)
+    r.raise_for_status()
+    html_archive.archive_page(url, r.text)
+    return r.text
+
+
+# 从 Kjell 商品页面提取价格、折扣、标题和零售商编号
+def extract_kjell_info(product_id, use_cache=True):
+    try:
+        url = KJELL_URL_TEMPLATE.format(product_id)
+        if not (KJELL_STREAMING and HTML_PARSER == "lxml"):
+            return parse_kjell_info(fetch_kjell_html(url, use_cache))
+
+        def fetch():
+            cached = http_cache.get_fresh(url) if use_cache else None
+            if cached is not None:
+                html_archive.archive_page(url, cached.text)
+                return parse_kjell_info(cached.text)
+
+            r = _send(url, timeout=15, stream=True)
+            r.raise_for_status()
+            result, body, complete = _stream_kjell_info(r)
+            request_metrics.record_stream_read(url, len(body))
+            # 读完整个页面时写入缓存（提前停止的不完整页面不缓存）；
+            # 存档保存已读取的部分，其中已包含解析需要的所有字段
+            if complete:
+                http_cache.store_response(url, r, body)
+            html_archive.archive_page(url, body.decode(r.encoding or "utf-8", errors="replace"))
+            return result
+
+        # 流式读取不经过 http_get，按产品页合并同时进行的请求并缓存解析结果
+        return request_coalescing.coalesce(("kjell_info", url), fetch, use_cached=use_cache)
+    except Exception:
+        return "ERROR", "ERROR", "ERROR", "ERROR"
+
+
+# ---------------- Kjell 品牌列表页（库存） ----------------
+
+KJELL_BASE_URL = "https://www.kjell.com"
+KJELL_LISTING_STRAINER = ("a", {"class": "product-card__link"})
+
+# 品牌列表页 URL（count 为每页数量，page 从 1 开始）
+KJELL_BRAND_LISTING_URL = KJELL_BASE_URL + "/se/varumarken/{brand}?count={count}&page={page}&sortBy=popularity"
+KJELL_LISTING_PAGE_SIZE = 240
+
+# 列表页上的商品总数（页面数据中的 totalCount，或 "312 produkter" 之类的文字）
+KJELL_TOTAL_COUNT_PATTERN = re.compile(r'"totalCount"\s*:\s*(\d+)|(\d+)\s+produkter')
+
+
+# 从列表页 HTML 中读取商品总数，找不到时返回 None
+def parse_kjell_listing_total(html):
+    match = KJELL_TOTAL_COUNT_PATTERN.search(html)
+    if not match:
+        return None
+    return int(match.group(1) or match.group(2))
+
+
+# 从 Kjell 品牌列表页 HTML 中解析每个产品的名称、链接和库存
+@request_metrics.timed_parse
+def parse_kjell_listing(html):
+    soup = make_soup(html, KJELL_LISTING_STRAINER)
+
+    product_cards = soup.find_all("a", class_="product-card__link")
+    records = []
+
+    for card in product_cards:
+        name = card.find("div", class_="product-card__title")
+        if not name:
+            continue
+        name = name.text.strip()
+        product_url = KJELL_BASE_URL + card['href']
+
+        availability = card.find("div", class_="product-card__availability")
+        if availability:
+            availability_text = availability.get_text(separator="\n", strip=True)
+            online = next((line for line in availability_text.split("\n") if "Online" in line), "Online: N/A")
+            butik = next((line for line in availability_text.split("\n") if "butiker" in line), "Finns i 0 butiker")
+
+            # 提取数字
+            online_qty = online.replace("Online", "").strip()
+            butik_qty = ''.join(filter(str.isdigit, butik))
+        else:
+            online_qty = "N/A"
+            butik_qty = "0"
+
+        records.append({
+            "Datum": datetime.now().strftime("%Y-%m-%d"),
+            "Produktnamn": name,
+            "Produktlänk": product_url,
+            "Online": online_qty,
+            "Butik": butik_qty
+        })
+
+    return records
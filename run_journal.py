@@ -0,0 +1,74 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+# 批量抓取的断点记录：每完成一个任务（例如 (产品, 国家)）就追加一行到本地 JSON-lines 文件，
+# 运行中断后可以选择“继续上一次运行”，跳过已完成的任务并合并结果
+
+JOURNAL_DIR = os.environ.get("RUN_JOURNAL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".runs"))
+
+
+def journal_path(name):
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+    return os.path.join(JOURNAL_DIR, safe_name + ".jsonl")
+
+
+class RunJournal:
+    # name   - 任务类型名称，例如 "elkjop"、"kjell_CN competitors"
+    # resume - True 时读取上一次的记录并继续；False 时开始新的运行（清空旧记录）
+    def __init__(self, name, resume=False):
+        self.path = journal_path(name)
+        self.completed = {}
+        self.lock = threading.Lock()
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+
+        if resume and os.path.exists(self.path):
+            self._load()
+            self.file = open(self.path, "a", encoding="utf-8")
+        else:
+            self.file = open(self.path, "w", encoding="utf-8")
+            self._write({"started_at": datetime.now().isoformat(timespec="seconds")})
+
+    # 读取已完成的任务；最后一行可能因中断而不完整，直接忽略
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "key" in entry:
+                    self.completed[self._key(entry["key"])] = entry["result"]
+
+    @staticmethod
+    def _key(key):
+        return tuple(str(k) for k in key) if isinstance(key, (list, tuple)) else (str(key),)
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def is_done(self, key):
+        return self._key(key) in self.completed
+
+    def get(self, key):
+        return self.completed.get(self._key(key))
+
+    # 记录一个已完成的任务（线程安全）
+    def record(self, key, result):
+        key = self._key(key)
+        result = list(result)
+        with self.lock:
+            self.completed[key] = result
+            self._write({"key": list(key), "result": result})
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+# 是否存在可以继续的上一次运行
+def has_journal(name):
+    return os.path.exists(journal_path(name))
@@ -0,0 +1,147 @@
+import re
+import bisect
+import threading
+from collections import Counter
+
+# 产品对照表的内存搜索索引（用于输入即搜索的产品选择框）：
+#   - 编号 -> 名称、规范化名称 -> 编号的哈希表，按名称取编号不再扫描整张表
+#   - 规范化名称的三字母组（trigram）倒排索引，容忍大小写、空格、标点和少量拼写差异
+#   - 排序后的名称 / 单词列表，用二分查找做前缀匹配
+# 查询只访问与输入共享三字母组的条目，对照表增长到几万个 SKU 时仍然很快
+
+# 三字母组相似度低于此值的候选不返回
+MIN_SCORE = 0.3
+
+# 默认返回的结果数
+DEFAULT_LIMIT = 20
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+# 名称比较时忽略大小写、空格和标点，例如 "ARCHER AX10" 与 "Archer AX-10" 视为相同
+def normalize_name(name):
+    return _NON_ALNUM.sub("", str(name).lower())
+
+
+# 名称中的单词（规范化后），用于单词前缀匹配，例如 "ax10" 匹配 "Archer AX10"
+def _tokens(name):
+    return [token for token in _NON_ALNUM.split(str(name).lower()) if token]
+
+
+# 三字母组（前面补两个空格，使开头的字母权重更高）
+def _trigrams(key):
+    padded = "  " + key
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    # entries 为 (Product ID, Product Name, 来源) 的可迭代对象，来源可以是对照表名称或零售商
+    def __init__(self, entries):
+        self.entries = []  # [(Product ID, Product Name, 来源, 规范化名称)]
+        self.names_by_id = {}  # (来源, Product ID) -> Product Name，来源为 None 时不区分来源
+        self.ids_by_name = {}  # (来源, 规范化名称) -> Product ID，来源为 None 时不区分来源
+        self._entries_by_id = {}  # Product ID -> 条目序号列表
+        self._postings = {}  # 三字母组 -> 条目序号列表
+        self._sizes = []  # 每个条目的三字母组数量
+        tokens = []
+        seen = set()
+        for product_id, product_name, source in entries:
+            product_id = str(product_id).strip()
+            product_name = str(product_name).strip()
+            key = normalize_name(product_name)
+            if not product_id or not key or (source, product_id, key) in seen:
+                continue
+            seen.add((source, product_id, key))
+            idx = len(self.entries)
+            self.entries.append((product_id, product_name, source, key))
+            for scope in (source, None):
+                self.names_by_id.setdefault((scope, product_id), product_name)
+                self.ids_by_name.setdefault((scope, key), product_id)
+            self._entries_by_id.setdefault(product_id, []).append(idx)
+            grams = _trigrams(key)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(idx)
+            tokens.extend((token, idx) for token in _tokens(product_name))
+            tokens.append((key, idx))
+        tokens.sort()
+        self._token_keys = [token for token, _ in tokens]
+        self._token_ids = [idx for _, idx in tokens]
+
+    def __len__(self):
+        return len(self.entries)
+
+    # 按名称取编号（忽略大小写和标点），没有时返回 None
+    def lookup_id(self, name, source=None):
+        return self.ids_by_name.get((source, normalize_name(name)))
+
+    def lookup_name(self, product_id, source=None):
+        return self.names_by_id.get((source, str(product_id).strip()))
+
+    # 名称或名称中某个单词以 prefix 开头的条目序号
+    def _prefix_ids(self, prefix):
+        start = bisect.bisect_left(self._token_keys, prefix)
+        end = bisect.bisect_right(self._token_keys, prefix + "\uffff", start)
+        return self._token_ids[start:end]
+
+    # 模糊搜索，返回按相关度排序的 [(Product ID, Product Name, 来源, 分数)]：
+    #   编号或名称完全相同 1.0 > 名称 / 单词前缀匹配 0.9 以上 > 三字母组相似度（Dice 系数）
+    #   sources 不为空时只返回这些来源的条目
+    def search(self, query, limit=DEFAULT_LIMIT, sources=None):
+        key = normalize_name(query)
+        if not key:
+            return []
+        scores = {idx: 1.0 for idx in self._entries_by_id.get(str(query).strip(), ())}
+        for idx in self._prefix_ids(key):
+            entry_key = self.entries[idx][3]
+            # 前缀越接近完整名称分数越高
+            scores[idx] = max(scores.get(idx, 0), 1.0 if entry_key == key else 0.9 + 0.09 * len(key) / len(entry_key))
+
+        grams = _trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        for idx, count in shared.items():
+            score = 2.0 * count / (len(grams) + self._sizes[idx])
+            if score >= MIN_SCORE and score > scores.get(idx, 0):
+                scores[idx] = min(score, 0.89)
+
+        results = [
+            (self.entries[idx][0], self.entries[idx][1], self.entries[idx][2], round(score, 3))
+            for idx, score in scores.items()
+            if sources is None or self.entries[idx][2] in sources
+        ]
+        results.sort(key=lambda result: (-result[3], len(result[1]), result[1]))
+        return results[:limit]
+
+
+# 从对照表 DataFrame 建立索引：frames 为 {来源: DataFrame}（需要 Product ID / Product Name 两列）
+def build_index(frames):
+    entries = []
+    for source, df in frames.items():
+        if df is None or 'Product ID' not in df.columns or 'Product Name' not in df.columns:
+            continue
+        entries.extend(
+            (product_id, product_name, source)
+            for product_id, product_name in zip(df['Product ID'], df['Product Name'])
+            if isinstance(product_name, str)
+        )
+    return SearchIndex(entries)
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+# 进程内共享的索引：对照表对象不变时（mapping_loader 在重新验证前返回同一个 DataFrame）直接复用，
+# 对照表更新后重新建立
+def get_index(frames):
+    cache_key = tuple(sorted(frames))
+    with _lock:
+        cached = _indexes.get(cache_key)
+        if cached is not None and all(cached[0][source] is frames[source] for source in cache_key):
+            return cached[1]
+    index = build_index(frames)
+    with _lock:
+        _indexes[cache_key] = (dict(frames), index)
+    return index
@@ -0,0 +1,47 @@
+import os
+
+import streamlit as st
+
+from mapping_loader import load_mapping_csv
+from search_index import get_index
+
+# 各查询页面共用的产品搜索框：输入部分名称即可模糊搜索（忽略大小写、空格和标点），
+# 每个页面只为自己用到的对照表建立索引（进程内共享，使用同一张表的页面共用一个索引）
+
+# 没有输入搜索内容时，选择框中最多列出的产品数
+MAX_BROWSE_OPTIONS = 500
+
+
+# 对照表在索引中的来源名称（文件名）
+def mapping_source(csv_url):
+    return os.path.basename(csv_url)
+
+
+# 页面对照表（csv_urls 为对照表链接列表）的搜索索引，对照表更新后自动重建
+def load_mapping_index(csv_urls):
+    return get_index({mapping_source(url): load_mapping_csv(url) for url in csv_urls})
+
+
+# 搜索框 + 匹配结果选择框，返回选中的 (Product ID, Product Name)，未选择时返回 None
+#   sources - 只搜索这些来源（对照表文件名），为空时搜索整个索引
+def render_product_search(index, sources=None, label="Or search for a product name:", key="product_search"):
+    query = st.text_input(label, "", key=key, placeholder="e.g. archer ax10")
+    if query.strip():
+        results = index.search(query, sources=sources)
+        if not results:
+            st.caption("No matching products.")
+            return None
+    else:
+        results = [entry for entry in index.entries if sources is None or entry[2] in sources]
+        if len(results) > MAX_BROWSE_OPTIONS:
+            st.caption(f"Showing the first {MAX_BROWSE_OPTIONS} of {len(results)} products — type to search.")
+            results = results[:MAX_BROWSE_OPTIONS]
+
+    choice = st.selectbox(
+        "Matching products:",
+        [None] + results,
+        format_func=lambda result: "" if result is None else f"{result[1]} ({result[0]})",
+        index=1 if query.strip() else 0,  # 有搜索内容时默认选中最相关的结果
+        key=f"{key}_select_{query.strip().lower()}",  # 搜索内容变化时重新选中最相关的结果
+    )
+    return None if choice is None else (choice[0], choice[1])
@@ -0,0 +1,37 @@
+import pandas as pd
+
+from price_analysis import SPREAD_COLUMNS, cross_country_spreads, parse_price_series
+
+FX_RATES = {"SEK": 1.0, "NOK": 1.0, "EUR": 10.0, "DKK": 1.5}
+COLUMNS = ["Date", "Product ID", "Product Name", "Country", "Product URL", "Regular Price", "Promo Price"]
+
+
+def test_parse_price_series_formats():
+    values = parse_price_series(pd.Series(["1.299,-", "1 299,00 €", "299.-", "1,299.50", "12,5", "N/A", "ERROR",
+                                           "Request failed: timeout", "", None]))
+    assert values[:5].tolist() == [1299.0, 1299.0, 299.0, 1299.5, 12.5]
+    assert values[5:].isna().all()
+
+
+def test_cross_country_spreads():
+    df = pd.DataFrame([
+        ["2024-01-01", "1", "Archer AX10", "Sweden", "u", "1000", "N/A"],
+        ["2024-01-01", "1", "Archer AX10", "Finland", "u", "120", "90"],
+        ["2024-01-01", "2", "Deco M4", "Norway", "u", "ERROR", "ERROR"],
+    ], columns=COLUMNS)
+    result = cross_country_spreads(df, FX_RATES).set_index("Product ID")
+
+    row = result.loc["1"]
+    assert (row["Min"], row["Max"]) == (900.0, 1000.0)
+    assert (row["Cheapest"], row["Most Expensive"]) == ("Finland", "Sweden")
+    assert row["Spread"] == 100.0
+    assert row["Spread %"] == 11.1
+    assert "2" not in result.index  # 没有任何价格的产品不出现
+
+
+def test_cross_country_spreads_without_prices():
+    df = pd.DataFrame([["2024-01-01", "1", "Archer AX10", "Sweden", "u", "ERROR", "ERROR"]], columns=COLUMNS)
+    for frame in (df, df.iloc[:0]):
+        result = cross_country_spreads(frame, FX_RATES)
+        assert result.empty
+        assert list(result.columns) == ["Date", "Product ID", "Product Name"] + SPREAD_COLUMNS